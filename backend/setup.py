@@ -33,6 +33,10 @@ setup(
         "console_scripts": [
             "migrate_testscaffold_db = testscaffold.scripts.migratedb:main",
             "initialize_testscaffold_db = testscaffold.scripts.initializedb:main",
+            "benchmark_testscaffold_users = testscaffold.scripts.benchmark_users:main",
+            "benchmark_testscaffold_json = testscaffold.scripts.benchmark_json:main",
+            "benchmark_testscaffold_celery_tasks = testscaffold.scripts.benchmark_celery_tasks:main",
+            "benchmark_testscaffold_celery_serializers = testscaffold.scripts.benchmark_celery_serializers:main",
         ],
     },
 )
@@ -1,4 +1,3 @@
-import datetime
 import logging
 import warnings
 
@@ -6,7 +5,8 @@ from datadog import statsd, initialize
 from pyramid.authentication import AuthTktAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.config import Configurator, PHASE3_CONFIG
-from pyramid.renderers import JSON
+from pyramid.tweens import INGRESS
+from pyramid.settings import asbool
 import sentry_sdk
 from sentry_sdk.integrations.pyramid import PyramidIntegration
 from sentry_sdk.integrations.celery import CeleryIntegration
@@ -17,6 +17,8 @@ from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 import testscaffold.util.cache_regions as cache_regions
 import testscaffold.util.encryption as encryption
 from testscaffold.celery import configure_celery
+from testscaffold.renderers import FastJSON
+from testscaffold.services.resource_tree_service import configure_tree_service
 from testscaffold.security import (
     groupfinder,
     AuthTokenAuthenticationPolicy,
@@ -43,11 +45,12 @@ def main(global_config, **settings):
         # return API token policy if header is present
         if request.headers.get("x-testscaffold-auth-token"):
             policy = "auth_token_policy"
-        log.info("Policy used: {}".format(policy))
         return policy
 
     auth_policy = PyramidSelectorPolicy(
-        policy_selector=policy_selector, policies={"auth_tkt": auth_tkt, "auth_token_policy": auth_token_policy},
+        policy_selector=policy_selector,
+        policies={"auth_tkt": auth_tkt, "auth_token_policy": auth_token_policy},
+        log_selection=asbool(settings.get("auth.log_policy_selection", False)),
     )
 
     settings["jinja2.undefined"] = "strict"
@@ -78,35 +81,39 @@ def main(global_config, **settings):
         config.pyramid_apispec_add_explorer(spec_route_name="openapi_spec")
         config.add_translation_dirs("testscaffold:locale/", "wtforms:locale/")
 
-        # modify json renderer
-        json_renderer = JSON(indent=4)
-
-        def datetime_adapter(obj, request):
-            return obj.isoformat()
-
-        json_renderer.add_adapter(datetime.datetime, datetime_adapter)
-        json_renderer.add_adapter(datetime.date, datetime_adapter)
+        # compact json renderer, `?pretty=1` indents output
+        json_renderer = FastJSON(backend=settings.get("json_renderer.backend", "auto"))
         config.add_renderer("json", json_renderer)
 
         # set crypto key used to store sensitive data like auth tokens
         encryption.ENCRYPTION_SECRET = settings["encryption_secret"]
+        configure_tree_service(settings)
         # CSRF is enabled by defualt
         # use X-XSRF-TOKEN for angular
         # config.set_default_csrf_options(require_csrf=True, header='X-XSRF-TOKEN')
         config.add_view_deriver("testscaffold.predicates.auth_token_aware_csrf_view", name="csrf_view")
 
-        config.include("pyramid_mailer")
+        # pyramid_mailer with pooled smtp connection or local outbox
+        config.include("testscaffold.util.mail")
         config.include("pyramid_jinja2")
-        config.include("pyramid_beaker")
+        # pyramid_beaker with session operation counting
+        config.include("testscaffold.util.session")
         config.include("ziggurat_foundations.ext.pyramid.sign_in")
 
         # make request.user available
         config.add_request_method("testscaffold.util.request:get_user", "user", reify=True)
+        config.add_request_method(
+            "testscaffold.util.request:get_effective_permissions", "effective_permissions", reify=True
+        )
+        config.add_request_method("testscaffold.util.request:is_stateless_request", "stateless", reify=True)
+        config.add_request_method("testscaffold.tweens:get_response_cache_route", "response_cache_route", reify=True)
         config.add_request_method("testscaffold.util.request:safe_json_body", "safe_json_body", reify=True)
         config.add_request_method("testscaffold.util.request:unsafe_json_body", "unsafe_json_body", reify=True)
         config.add_request_method("testscaffold.util.request:get_authomatic", "authomatic", reify=True)
 
         config.add_view_predicate("context_type_class", "testscaffold.predicates.ContextTypeClass")
+        # outermost so cache hits skip transaction, session and subscribers
+        config.add_tween("testscaffold.tweens.response_cache_tween_factory", under=INGRESS)
 
         config.scan("testscaffold.events")
         config.scan("testscaffold.subscribers")
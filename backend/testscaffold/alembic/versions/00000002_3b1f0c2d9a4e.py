@@ -0,0 +1,36 @@
+"""indexes for entry list filters
+
+Revision ID: 3b1f0c2d9a4e
+Revises: afe8882875e5
+Create Date: 2026-10-18 10:12:41.512204
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3b1f0c2d9a4e"
+down_revision = "afe8882875e5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_resources_parent_id_ordering", "resources", ["parent_id", "ordering"])
+    # pattern ops make LIKE 'prefix%' indexable regardless of collation
+    op.create_index(
+        "ix_resources_resource_name_pattern",
+        "resources",
+        ["resource_name"],
+        postgresql_ops={"resource_name": "varchar_pattern_ops"},
+    )
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_entries_note_trgm", "entries", ["note"], postgresql_using="gin", postgresql_ops={"note": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_entries_note_trgm", table_name="entries")
+    op.drop_index("ix_resources_resource_name_pattern", table_name="resources")
+    op.drop_index("ix_resources_parent_id_ordering", table_name="resources")
@@ -0,0 +1,65 @@
+"""full text search vector for entries
+
+Revision ID: 8d2e5a71c4b6
+Revises: 3b1f0c2d9a4e
+Create Date: 2026-10-18 11:03:17.228871
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# revision identifiers, used by Alembic.
+revision = "8d2e5a71c4b6"
+down_revision = "3b1f0c2d9a4e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("entries", sa.Column("search_vector", TSVECTOR()))
+    # resource_name lives in parent table so a generated column can't be used,
+    # rows in resources are always inserted before their entries
+    op.execute(
+        """
+        CREATE FUNCTION entries_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(
+                    (SELECT resource_name FROM resources WHERE resource_id = NEW.resource_id), ''
+                )), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.note, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER entries_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF note ON entries
+        FOR EACH ROW EXECUTE PROCEDURE entries_search_vector_update();
+
+        CREATE FUNCTION resources_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            UPDATE entries SET note = note WHERE resource_id = NEW.resource_id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER resources_search_vector_trigger
+        AFTER UPDATE OF resource_name ON resources
+        FOR EACH ROW WHEN (OLD.resource_name IS DISTINCT FROM NEW.resource_name)
+        EXECUTE PROCEDURE resources_search_vector_update();
+        """
+    )
+    # backfill existing rows through the trigger
+    op.execute("UPDATE entries SET note = note")
+    op.create_index("ix_entries_search_vector", "entries", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade():
+    op.drop_index("ix_entries_search_vector", table_name="entries")
+    op.execute("DROP TRIGGER resources_search_vector_trigger ON resources")
+    op.execute("DROP FUNCTION resources_search_vector_update()")
+    op.execute("DROP TRIGGER entries_search_vector_trigger ON entries")
+    op.execute("DROP FUNCTION entries_search_vector_update()")
+    op.drop_column("entries", "search_vector")
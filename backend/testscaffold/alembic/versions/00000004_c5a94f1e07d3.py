@@ -0,0 +1,35 @@
+"""trigram indexes for user search
+
+Revision ID: c5a94f1e07d3
+Revises: 8d2e5a71c4b6
+Create Date: 2026-10-18 11:48:02.906133
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c5a94f1e07d3"
+down_revision = "8d2e5a71c4b6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # serve LIKE/ILIKE with leading wildcards as well as prefixes
+    op.create_index(
+        "ix_users_user_name_trgm",
+        "users",
+        ["user_name"],
+        postgresql_using="gin",
+        postgresql_ops={"user_name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_users_email_trgm", "users", ["email"], postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_users_email_trgm", table_name="users")
+    op.drop_index("ix_users_user_name_trgm", table_name="users")
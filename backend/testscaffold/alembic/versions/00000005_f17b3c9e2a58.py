@@ -0,0 +1,76 @@
+"""materialized ancestor path for resources
+
+Revision ID: f17b3c9e2a58
+Revises: c5a94f1e07d3
+Create Date: 2026-10-18 12:40:55.170394
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# revision identifiers, used by Alembic.
+revision = "f17b3c9e2a58"
+down_revision = "c5a94f1e07d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("resources", sa.Column("path_ids", ARRAY(sa.Integer())))
+    op.execute(
+        """
+        WITH RECURSIVE tree AS (
+                SELECT resource_id, ARRAY[resource_id] AS path_ids
+                FROM resources WHERE parent_id IS NULL
+              UNION ALL
+                SELECT res.resource_id, tree.path_ids || res.resource_id
+                FROM resources res JOIN tree ON res.parent_id = tree.resource_id
+        )
+        UPDATE resources SET path_ids = tree.path_ids FROM tree WHERE resources.resource_id = tree.resource_id;
+        """
+    )
+    # path of the row itself is derived from its parent, sequence defaults
+    # are applied before BEFORE triggers so resource_id is known on insert
+    op.execute(
+        """
+        CREATE FUNCTION resources_path_ids_update() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.path_ids := ARRAY[NEW.resource_id];
+            ELSE
+                NEW.path_ids := (SELECT path_ids FROM resources WHERE resource_id = NEW.parent_id) || NEW.resource_id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER resources_path_ids_trigger
+        BEFORE INSERT OR UPDATE OF parent_id ON resources
+        FOR EACH ROW EXECUTE PROCEDURE resources_path_ids_update();
+
+        CREATE FUNCTION resources_descendant_path_ids_update() RETURNS trigger AS $$
+        BEGIN
+            UPDATE resources SET path_ids = NEW.path_ids || path_ids[array_length(OLD.path_ids, 1) + 1:]
+            WHERE path_ids @> ARRAY[NEW.resource_id] AND resource_id <> NEW.resource_id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER resources_descendant_path_ids_trigger
+        AFTER UPDATE OF parent_id ON resources
+        FOR EACH ROW WHEN (OLD.path_ids IS DISTINCT FROM NEW.path_ids)
+        EXECUTE PROCEDURE resources_descendant_path_ids_update();
+        """
+    )
+    op.create_index("ix_resources_path_ids", "resources", ["path_ids"], postgresql_using="gin")
+
+
+def downgrade():
+    op.drop_index("ix_resources_path_ids", table_name="resources")
+    op.execute("DROP TRIGGER resources_descendant_path_ids_trigger ON resources")
+    op.execute("DROP FUNCTION resources_descendant_path_ids_update()")
+    op.execute("DROP TRIGGER resources_path_ids_trigger ON resources")
+    op.execute("DROP FUNCTION resources_path_ids_update()")
+    op.drop_column("resources", "path_ids")
@@ -0,0 +1,70 @@
+"""updated_date on users, groups and resources
+
+Revision ID: 9a3c7e5b1d24
+Revises: f17b3c9e2a58
+Create Date: 2026-10-18 14:05:12.418920
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9a3c7e5b1d24"
+down_revision = "f17b3c9e2a58"
+branch_labels = None
+depends_on = None
+
+TABLES = ("users", "groups", "resources")
+
+TRIGGER_SQL = """
+CREATE TRIGGER {table}_updated_date_trigger
+BEFORE UPDATE ON {table}
+FOR EACH ROW EXECUTE PROCEDURE touch_updated_date();
+"""
+
+
+def upgrade():
+    for table in TABLES:
+        column = sa.Column(
+            "updated_date", sa.DateTime(), nullable=False, server_default=sa.text("(now() at time zone 'utc')")
+        )
+        op.add_column(table, column)
+    op.execute(
+        """
+        CREATE FUNCTION touch_updated_date() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_date := now() at time zone 'utc';
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in TABLES:
+        op.execute(TRIGGER_SQL.format(table=table))
+    # note lives in entries table, changes are propagated to parent resource row
+    op.execute(
+        """
+        CREATE FUNCTION entries_updated_date_update() RETURNS trigger AS $$
+        BEGIN
+            UPDATE resources SET updated_date = now() at time zone 'utc' WHERE resource_id = NEW.resource_id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER entries_updated_date_trigger
+        AFTER UPDATE OF note ON entries
+        FOR EACH ROW WHEN (OLD.note IS DISTINCT FROM NEW.note)
+        EXECUTE PROCEDURE entries_updated_date_update();
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER entries_updated_date_trigger ON entries")
+    op.execute("DROP FUNCTION entries_updated_date_update()")
+    for table in TABLES:
+        op.execute("DROP TRIGGER {table}_updated_date_trigger ON {table}".format(table=table))
+    op.execute("DROP FUNCTION touch_updated_date()")
+    for table in TABLES:
+        op.drop_column(table, "updated_date")
@@ -1,29 +1,42 @@
 # -*- coding: utf-8 -*-
 import logging
+from contextlib import contextmanager
 
 
-from celery import Celery, signals
+from celery import Celery, Task, signals
 from click import Option
 from kombu.serialization import register
+from pyramid.interfaces import IRequestFactory
 from pyramid.paster import bootstrap
-from pyramid.scripting import prepare
+from pyramid.request import Request, apply_request_extensions
 from pyramid.settings import asbool
-from pyramid.threadlocal import get_current_request, get_current_registry
+from pyramid.threadlocal import RequestContext, get_current_registry
 from transaction.interfaces import NoTransaction
 
-from testscaffold.celery.encoders import json_dumps, json_loads
+from testscaffold.celery.encoders import json_dumps, json_loads, msgpack, msgpack_dumps, msgpack_loads
 
 log = logging.getLogger(__name__)
 
 register(
     "date_json", json_dumps, json_loads, content_type="application/x-date_json", content_encoding="utf-8",
 )
+# workers accept both formats so serializer can be switched without draining queues
+ACCEPT_CONTENT = ("date_json",)
+if msgpack is not None:
+    register(
+        "msgpack_ext",
+        msgpack_dumps,
+        msgpack_loads,
+        content_type="application/x-msgpack_ext",
+        content_encoding="binary",
+    )
+    ACCEPT_CONTENT += ("msgpack_ext",)
 
 CELERY_CONFIG = {
     "imports": ("testscaffold.celery.tasks",),
     "task_time_limit": 300,
     "worker_max_tasks_per_child": 10000,
-    "accept_content": ("date_json",),
+    "accept_content": ACCEPT_CONTENT,
     "task_serializer": "date_json",
     "result_serializer": "date_json",
     "broker_url": None,
@@ -36,7 +49,44 @@ CELERY_CONFIG = {
     },
 }
 
-celery_app = Celery()
+
+@contextmanager
+def task_context(registry):
+    """
+    Request for single task, pushed as current request so tasks can use
+    `get_current_request()`. Its dbsession is created on first use and
+    closed once when task finishes, unfinished transaction is aborted
+    """
+    request_factory = registry.queryUtility(IRequestFactory, default=Request)
+    request = request_factory.blank("/", base_url=registry.settings.get("base_url"))
+    request.registry = registry
+    with RequestContext(request):
+        apply_request_extensions(request)
+        try:
+            yield request
+        finally:
+            # reified properties, don't create them just to clean up
+            if "tm" in request.__dict__:
+                abort_transaction(request)
+            dbsession = request.__dict__.get("dbsession")
+            # zope.sqlalchemy closes session when transaction ends, only leftovers are closed here
+            if dbsession is not None and dbsession.in_transaction():
+                dbsession.close()
+            if request.finished_callbacks:
+                request._process_finished_callbacks()
+
+
+class PyramidTask(Task):
+    def __call__(self, *args, **kwargs):
+        env = getattr(self.app, "pyramid", None)
+        if env is None:
+            # eager tasks and direct calls run inside caller's request
+            return super(PyramidTask, self).__call__(*args, **kwargs)
+        with task_context(env["registry"]):
+            return super(PyramidTask, self).__call__(*args, **kwargs)
+
+
+celery_app = Celery(task_cls=PyramidTask)
 celery_app.user_options["preload"].add(
     Option(("--ini",), default=None, help="Specifies pyramid configuration file location.",)
 )
@@ -70,70 +120,67 @@ def configure_celery(settings):
         CELERY_CONFIG["worker_concurrency"] = int(settings["celery.concurrency"])
     if settings.get("celery.timezone"):
         CELERY_CONFIG["timezone"] = settings["celery.timezone"]
-
-    if asbool(settings.get("celery.always_eager")):
-        # WARNING: NEVER ENABLE IN PRODUCTION: enable to disable async task execution locally for celery
-        CELERY_CONFIG["task_always_eager"] = True
-        CELERY_CONFIG["task_eager_propagates"] = True
+    if settings.get("celery.serializer"):
+        serializer = settings["celery.serializer"]
+        if serializer == "msgpack_ext" and msgpack is None:
+            raise ValueError("celery.serializer = msgpack_ext requires msgpack package to be installed")
+        if serializer not in ACCEPT_CONTENT:
+            raise ValueError("Unknown celery.serializer: {}".format(serializer))
+        CELERY_CONFIG["task_serializer"] = serializer
+        CELERY_CONFIG["result_serializer"] = serializer
+
+    # WARNING: NEVER ENABLE IN PRODUCTION: enable to disable async task execution locally for celery
+    # set both ways so app configured later in same process doesn't inherit eager mode
+    always_eager = asbool(settings.get("celery.always_eager"))
+    CELERY_CONFIG["task_always_eager"] = always_eager
+    CELERY_CONFIG["task_eager_propagates"] = always_eager
     log.info("Configuring celery from ini file")
     celery_app.config_from_object(CELERY_CONFIG)
 
 
-@signals.after_task_publish.connect
-def task_after_task_publish(signal, sender, *args, **kwargs):
-    registry = get_current_registry()
-    registry.statsd_client.increment("queue_tasks_count", 1, tags=["signal:after_task_publish"])
+def count_task_signal(signal_name):
+    """ one statsd call per task outcome """
+    env = getattr(celery_app, "pyramid", None)
+    registry = env["registry"] if env else get_current_registry()
+    statsd_client = getattr(registry, "statsd_client", None)
+    if statsd_client:
+        statsd_client.increment("queue_tasks_count", 1, tags=["signal:{}".format(signal_name)])
 
 
-@signals.task_prerun.connect
-def task_prerun(signal, sender, *args, **kwargs):
-    log.debug("task prerun %s" % sender.name)
-    env = celery_app.pyramid
-    env = prepare(registry=env["request"].registry)
-    env["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:prerun"])
+@signals.after_task_publish.connect
+def task_after_task_publish(signal, sender, *args, **kwargs):
+    count_task_signal("after_task_publish")
 
 
 @signals.task_retry.connect
 def task_retry_signal(request, reason, einfo, **kwargs):
     log.debug("task retry")
-    request = get_current_request()
-    abort_transaction(request)
-    celery_app.pyramid["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:retry"])
-    celery_app.pyramid["closer"]()
+    count_task_signal("retry")
 
 
 @signals.task_revoked.connect
 def task_revoked_signal(request, terminated, signum, expired, **kwaargs):
     log.debug("task revoked")
-    request = get_current_request()
-    abort_transaction(request)
-    celery_app.pyramid["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:revoked"])
-    celery_app.pyramid["closer"]()
+    count_task_signal("revoked")
 
 
 @signals.task_success.connect
 def task_ok(signal, sender, **result):
     log.debug("task %s finished" % sender.name)
-    request = get_current_request()
-    abort_transaction(request)
-    celery_app.pyramid["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:success"])
-    celery_app.pyramid["closer"]()
-
-
-@signals.task_postrun.connect
-def task_postrun_log(signal, sender, task_id, task, args, kwargs, retval, state, **kw):
-    log.debug("task %s postrun %s" % (sender.name, state))
-    celery_app.pyramid["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:postrun"])
-    celery_app.pyramid["closer"]()
+    count_task_signal("success")
 
 
 @signals.task_failure.connect
 def task_failed(signal, sender, task_id, exception, args, kwargs, traceback, einfo, **kw):
     log.info("task %s FAILED" % sender.name)
-    request = get_current_request()
-    abort_transaction(request)
-    celery_app.pyramid["registry"].statsd_client.increment("queue_tasks_count", 1, tags=["signal:failed"])
-    celery_app.pyramid["closer"]()
+    count_task_signal("failed")
+
+
+@signals.worker_shutdown.connect
+def close_pyramid_env(**kwargs):
+    env = getattr(celery_app, "pyramid", None)
+    if env is not None:
+        env["closer"]()
 
 
 def abort_transaction(request):
@@ -1,6 +1,11 @@
 import decimal
 import json
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
 
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
 
@@ -38,3 +43,50 @@ def json_dumps(obj):
 
 def json_loads(obj):
     return json.loads(obj, object_hook=date_decoder)
+
+
+# msgpack extension type codes
+EXT_DATETIME = 1
+EXT_DATE = 2
+EXT_TIMEDELTA = 3
+EXT_DECIMAL = 4
+
+
+def msgpack_default(obj):
+    # datetime has to be checked before its date base class
+    if isinstance(obj, datetime):
+        # fields and utc offset in seconds, fromisoformat isn't available on py36
+        offset = obj.utcoffset()
+        fields = obj.timetuple()[:6] + (obj.microsecond, offset.total_seconds() if offset is not None else None)
+        return msgpack.ExtType(EXT_DATETIME, msgpack.packb(fields))
+    elif isinstance(obj, date):
+        return msgpack.ExtType(EXT_DATE, msgpack.packb((obj.year, obj.month, obj.day)))
+    elif isinstance(obj, timedelta):
+        return msgpack.ExtType(EXT_TIMEDELTA, msgpack.packb((obj.days, obj.seconds, obj.microseconds)))
+    elif isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(obj).encode("ascii"))
+    raise TypeError("Object of type {} is not msgpack serializable".format(type(obj).__name__))
+
+
+def msgpack_ext_hook(code, data):
+    if code == EXT_DATETIME:
+        fields = msgpack.unpackb(data)
+        offset = fields.pop()
+        tzinfo = timezone(timedelta(seconds=offset)) if offset is not None else None
+        return datetime(*fields, tzinfo=tzinfo)
+    elif code == EXT_DATE:
+        return date(*msgpack.unpackb(data))
+    elif code == EXT_TIMEDELTA:
+        days, seconds, microseconds = msgpack.unpackb(data)
+        return timedelta(days=days, seconds=seconds, microseconds=microseconds)
+    elif code == EXT_DECIMAL:
+        return decimal.Decimal(data.decode("ascii"))
+    return msgpack.ExtType(code, data)
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, default=msgpack_default, use_bin_type=True)
+
+
+def msgpack_loads(obj):
+    return msgpack.unpackb(obj, ext_hook=msgpack_ext_hook, raw=False, strict_map_key=False)
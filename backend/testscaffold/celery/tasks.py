@@ -1,7 +1,10 @@
 import logging
 import requests
 
+from pyramid.renderers import render
 from pyramid.threadlocal import get_current_request
+from pyramid_mailer import get_mailer
+from pyramid_mailer.message import Message
 from testscaffold.services.resource_tree_service import tree_service
 
 log = logging.getLogger(__name__)
@@ -37,3 +40,24 @@ def test_task(subreddit, dt, d, td):
 def celery_beat_heartbeat():
     log.info("heartbeating celery")
     celery_app.pyramid["request"].registry.statsd_client.increment("heartbeat", 1, tags=["type:celery_beat"])
+
+
+@celery_app.task
+def send_emails(emails, locale_name=None):
+    """
+    Renders and sends mails queued by `EmailEvent` handler, messages share
+    worker's pooled smtp connection
+    """
+    request = get_current_request()
+    if locale_name:
+        # picked up by locale negotiator when templates are translated
+        request._LOCALE_ = locale_name
+    mailer = get_mailer(request)
+    sender = request.registry.settings["mailing.from_email"]
+    for email in emails:
+        rendered = render(email["tmpl_loc"], email["tmpl_vars"], request=request)
+        message = Message(
+            subject=email["tmpl_vars"]["email_title"], sender=sender, recipients=email["recipients"], html=rendered,
+        )
+        mailer.send_immediately(message, fail_silently=email["fail_silently"])
+    log.info("send_emails", extra={"count": len(emails)})
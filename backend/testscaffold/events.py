@@ -1,6 +1,7 @@
 class EmailEvent:
     """ When emitted the application will send email to recipients that is
-    generated from specified template
+    generated from specified template, template is rendered by celery
+    worker so `tmpl_vars` have to be serializable
     """
 
     def __init__(
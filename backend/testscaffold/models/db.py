@@ -1,6 +1,7 @@
 import sqlalchemy as sa
 
 from pyramid.security import Allow, ALL_PERMISSIONS
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import declared_attr
 
 from ziggurat_foundations.models.base import BaseModel
@@ -54,6 +55,9 @@ class Group(GroupMixin, Base):
         "admin_entries",
     )
 
+    # maintained by database trigger, used for conditional requests
+    updated_date = sa.Column(sa.DateTime(), server_default=sa.FetchedValue(), server_onupdate=sa.FetchedValue())
+
 
 class GroupPermission(GroupPermissionMixin, Base):
     pass
@@ -86,6 +90,9 @@ class User(UserMixin, Base):
 
     # registration_ip = sa.Column(sa.Unicode())
 
+    # maintained by database trigger, used for conditional requests
+    updated_date = sa.Column(sa.DateTime(), server_default=sa.FetchedValue(), server_onupdate=sa.FetchedValue())
+
     auth_tokens = sa.orm.relationship(
         "AuthToken",
         cascade="all,delete-orphan",
@@ -104,6 +111,11 @@ class User(UserMixin, Base):
 
 
 class Resource(ResourceMixin, Base):
+    # ids from tree root down to this resource, maintained by database triggers
+    path_ids = sa.Column(ARRAY(sa.Integer()), server_default=sa.FetchedValue(), server_onupdate=sa.FetchedValue())
+    # maintained by database triggers (also for changes of entries.note), used for conditional requests
+    updated_date = sa.Column(sa.DateTime(), server_default=sa.FetchedValue(), server_onupdate=sa.FetchedValue())
+
     @property
     def __acl__(self):
         acls = []
@@ -134,3 +146,7 @@ class Entry(Resource):
     )
 
     note = sa.Column(sa.UnicodeText())
+
+    # maintained by database triggers from resource_name and note,
+    # deferred because it is only used in WHERE/ORDER BY of searches
+    search_vector = sa.orm.deferred(sa.Column(TSVECTOR()))
@@ -0,0 +1,109 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import logging
+import uuid
+
+from pyramid.settings import asbool
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+JSON_BACKENDS = ("auto", "orjson", "stdlib")
+
+
+def default_adapter(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        # string keeps the precision
+        return str(obj)
+    raise TypeError("Type is not JSON serializable: {}".format(type(obj).__name__))
+
+
+def orjson_passthrough_option(type_or_iface):
+    """
+    orjson option that routes type with registered adapter to `default`,
+    0 if orjson calls `default` for it anyway, None if it can't be routed
+    """
+    if not isinstance(type_or_iface, type):
+        return 0
+    if issubclass(type_or_iface, (datetime.datetime, datetime.date, datetime.time)):
+        return orjson.OPT_PASSTHROUGH_DATETIME
+    if dataclasses.is_dataclass(type_or_iface):
+        return orjson.OPT_PASSTHROUGH_DATACLASS
+    if issubclass(type_or_iface, (uuid.UUID, enum.Enum)):
+        return None
+    return 0
+
+
+class FastJSON:
+    """
+    Replacement for pyramid JSON renderer, output is compact unless
+    `?pretty=1` is passed. Uses orjson when it is installed, stdlib json
+    otherwise, datetimes, dates and decimals are handled by both backends.
+
+    Adapters take precedence over types orjson serializes natively, if
+    an adapter is registered for a type orjson can't hand over to
+    `default` (UUID, Enum) renderer falls back to stdlib json.
+    """
+
+    def __init__(self, backend="auto"):
+        if backend not in JSON_BACKENDS:
+            raise ValueError("Unknown json backend {}".format(backend))
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "stdlib"
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson json backend requested but it is not installed")
+        self.backend = backend
+        self.adapters = []
+        self.orjson_option = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def add_adapter(self, type_or_iface, adapter):
+        """ same signature as pyramid.renderers.JSON.add_adapter """
+        self.adapters.append((type_or_iface, adapter))
+        if self.backend != "orjson":
+            return
+        option = orjson_passthrough_option(type_or_iface)
+        if option is None:
+            log.info("json_renderer_stdlib_fallback", extra={"adapter_type": type_or_iface.__name__})
+            self.backend = "stdlib"
+        else:
+            self.orjson_option |= option
+
+    def dumps(self, value, request=None, pretty=False):
+        def default(obj):
+            for type_or_iface, adapter in self.adapters:
+                if isinstance(obj, type_or_iface):
+                    return adapter(obj, request)
+            if hasattr(obj, "__json__"):
+                return obj.__json__(request)
+            return default_adapter(obj)
+
+        if self.backend == "orjson":
+            option = self.orjson_option
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(value, default=default, option=option)
+        if pretty:
+            return json.dumps(value, default=default, indent=2).encode("utf8")
+        return json.dumps(value, default=default, separators=(",", ":")).encode("utf8")
+
+    def __call__(self, info):
+        def _render(value, system):
+            request = system.get("request")
+            pretty = False
+            if request is not None:
+                response = request.response
+                if response.content_type == response.default_content_type:
+                    response.content_type = "application/json"
+                pretty = asbool(request.GET.get("pretty"))
+            return self.dumps(value, request=request, pretty=pretty)
+
+        return _render
@@ -32,6 +32,10 @@ def includeme(config):
     )
 
     config.add_route("api_objects", "/api/{version}/{object}")
+    # has to be registered before api_object
+    config.add_route("api_objects_search", "/api/{version}/{object}/search")
+    config.add_route("api_objects_bulk", "/api/{version}/{object}/bulk")
+    config.add_route("api_objects_export", "/api/{version}/{object}/export")
     config.add_route(
         "api_object", "/api/{version}/{object}/{object_id}", factory="testscaffold.security.object_security_factory",
     )
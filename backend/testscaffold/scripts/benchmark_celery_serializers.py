@@ -0,0 +1,64 @@
+from __future__ import print_function
+
+import datetime
+import decimal
+import os
+import sys
+import time
+
+from kombu.serialization import dumps, loads
+from pyramid.scripts.common import parse_vars
+
+from testscaffold.celery import ACCEPT_CONTENT
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print("usage: %s [messages=20000]\n" '(example: "%s messages=100000")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def build_payloads():
+    """ (label, task body) pairs shaped like args of tasks in `testscaffold.celery.tasks` """
+    now = datetime.datetime.utcnow()
+    test_task = (
+        ("python", now, now.date(), datetime.timedelta(minutes=5)),
+        {},
+        {"callbacks": None, "errbacks": None, "chain": None, "chord": None},
+    )
+    email = {
+        "recipients": ["user@example.com"],
+        "tmpl_vars": {"user": {"user_name": "user", "security_code": "a" * 64}, "email_title": "New password"},
+        "tmpl_loc": "testscaffold:templates/emails/lost_password.jinja2",
+        "fail_silently": False,
+    }
+    send_emails = (([email] * 5, "en"), {}, test_task[2])
+    rows = [
+        {"id": i, "created": now, "amount": decimal.Decimal("{}.25".format(i)), "note": "row {}".format(i)}
+        for i in range(100)
+    ]
+    report = ((rows,), {}, test_task[2])
+    return [("test_task", test_task), ("send_emails x5", send_emails), ("100 rows", report)]
+
+
+def main(argv=sys.argv):
+    """
+    Compares encode+decode throughput and payload size of registered
+    celery serializers on typical task arguments
+    """
+    if "-h" in argv or "--help" in argv:
+        usage(argv)
+    options = parse_vars(argv[1:])
+    total = int(options.pop("messages", 20000))
+
+    print("{} messages per serializer and payload".format(total))
+    for label, payload in build_payloads():
+        for serializer in ACCEPT_CONTENT:
+            start = time.perf_counter()
+            for x in range(total):
+                content_type, encoding, data = dumps(payload, serializer=serializer)
+                loads(data, content_type, encoding)
+            elapsed = time.perf_counter() - start
+            print(
+                "{:<16} {:<12} {:10.0f} msg/s  size {:>6} bytes".format(label, serializer, total / elapsed, len(data))
+            )
@@ -0,0 +1,76 @@
+from __future__ import print_function
+
+import os
+import statistics
+import sys
+import time
+
+from pyramid.paster import bootstrap, setup_logging
+from pyramid.scripting import prepare
+from pyramid.scripts.common import parse_vars
+
+from testscaffold.celery import abort_transaction, task_context
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print(
+        "usage: %s <config_uri> [tasks=2000] [var=value]\n" '(example: "%s development.ini tasks=10000")' % (cmd, cmd)
+    )
+    sys.exit(1)
+
+
+def task_body(request):
+    """ smallest task that uses database the way tasks do """
+    request.tm.begin()
+    request.dbsession.execute("SELECT 1")
+    request.tm.commit()
+
+
+def run_signal_handlers(registry):
+    """ per task work previously done by prerun/success/postrun signal handlers """
+    env = prepare(registry=registry)
+    task_body(env["request"])
+    abort_transaction(env["request"])
+    for signal_name in ("prerun", "success", "postrun"):
+        registry.statsd_client.increment("queue_tasks_count", 1, tags=["signal:{}".format(signal_name)])
+    # previously bootstrap closer was called here, closing per task env
+    # instead keeps threadlocal stack from growing during benchmark
+    env["closer"]()
+
+
+def run_task_context(registry):
+    with task_context(registry) as request:
+        task_body(request)
+    registry.statsd_client.increment("queue_tasks_count", 1, tags=["signal:success"])
+
+
+def main(argv=sys.argv):
+    """
+    Compares per task overhead of previous signal handler setup with
+    `task_context` used by PyramidTask
+    """
+    if len(argv) < 2:
+        usage(argv)
+    config_uri = argv[1]
+    options = parse_vars(argv[2:])
+    total = int(options.pop("tasks", 2000))
+    setup_logging(config_uri)
+    env = bootstrap(config_uri, options=options)
+    registry = env["registry"]
+    engine = registry["dbsession_factory"].kw["bind"]
+
+    print("{} tasks per variant".format(total))
+    for label, run in [("signal handlers (old)", run_signal_handlers), ("task_context", run_task_context)]:
+        timings = []
+        for x in range(total):
+            start = time.perf_counter()
+            run(registry)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            "{:<22} median {:7.3f}ms  p95 {:7.3f}ms  connections checked out {}".format(
+                label, statistics.median(timings), timings[int(len(timings) * 0.95)], engine.pool.checkedout()
+            )
+        )
+    env["closer"]()
@@ -0,0 +1,76 @@
+from __future__ import print_function
+
+import os
+import statistics
+import sys
+import time
+
+from pyramid.renderers import JSON
+from pyramid.scripts.common import parse_vars
+
+from testscaffold.models.db import Entry
+from testscaffold.renderers import FastJSON, orjson
+from testscaffold.validation.schemes import EntryCreateSchema
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print("usage: %s [entries=10000] [repeat=20]\n" '(example: "%s entries=100000")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def build_payload(total):
+    """ dumps transient entries the same way list endpoints do """
+    entries = [
+        Entry(
+            resource_id=i,
+            resource_name="entry {}".format(i),
+            resource_type="entry",
+            parent_id=i // 10 or None,
+            ordering=i % 10 + 1,
+            owner_user_id=1,
+            note="note for entry {}".format(i),
+        )
+        for i in range(1, total + 1)
+    ]
+    return EntryCreateSchema(context={}).dump(entries, many=True)
+
+
+def main(argv=sys.argv):
+    """
+    Compares serialization time and size of previous indent=4 stdlib
+    renderer with FastJSON backends on large EntryCreateSchema dumps
+    """
+    if "-h" in argv or "--help" in argv:
+        usage(argv)
+    options = parse_vars(argv[1:])
+    total = int(options.pop("entries", 10000))
+    repeat = int(options.pop("repeat", 20))
+    payload = build_payload(total)
+
+    renderers = [
+        ("stdlib indent=4 (old)", JSON(indent=4)(None)),
+        ("stdlib compact", FastJSON("stdlib")(None)),
+        ("stdlib pretty", lambda value, system: FastJSON("stdlib").dumps(value, pretty=True)),
+    ]
+    if orjson is not None:
+        renderers += [
+            ("orjson compact", FastJSON("orjson")(None)),
+            ("orjson pretty", lambda value, system: FastJSON("orjson").dumps(value, pretty=True)),
+        ]
+    else:
+        print("orjson is not installed, skipping orjson backend")
+
+    print("{} entries, {} runs per renderer".format(total, repeat))
+    for label, render in renderers:
+        timings = []
+        for x in range(repeat):
+            start = time.perf_counter()
+            result = render(payload, {})
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            "{:<22} median {:8.2f}ms  max {:8.2f}ms  size {:>10} bytes".format(
+                label, statistics.median(timings), timings[-1], len(result)
+            )
+        )
@@ -0,0 +1,105 @@
+from __future__ import print_function
+
+import os
+import statistics
+import sys
+import time
+from urllib import parse
+
+import transaction
+from pyramid.paster import get_appsettings, setup_logging
+from pyramid.request import Request
+from pyramid.scripts.common import parse_vars
+
+from testscaffold.models import get_engine, get_session_factory, get_tm_session
+from testscaffold.models.db import AuthToken, User, UserPermission
+
+BENCH_PREFIX = "bench_user_"
+
+# (label, query params) for /api/0.1/users
+LOOKUPS = [
+    ("prefix", {"user_name_like": BENCH_PREFIX + "54321"}),
+    ("prefix case insensitive", {"user_name_like": BENCH_PREFIX.upper() + "54321"}),
+    ("user_name contains", {"user_name_contains": "user_98765"}),
+    ("email contains", {"email_contains": "98765@bench"}),
+    ("user_name or email contains", {"search": "ER_12345"}),
+]
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print(
+        "usage: %s <config_uri> [users=1000000] [requests=20] [var=value]\n"
+        '(example: "%s development.ini users=1000000")' % (cmd, cmd)
+    )
+    sys.exit(1)
+
+
+def seed_users(dbsession, total):
+    """ inserts missing benchmark users in one statement, then refreshes planner stats """
+    existing = dbsession.query(User).filter(User.user_name.like(BENCH_PREFIX + "%")).count()
+    if existing < total:
+        dbsession.execute(
+            """
+            INSERT INTO users (user_name, email, status, security_code)
+            SELECT :prefix || g, :prefix || g || '@bench.local', 1, 'default'
+            FROM generate_series(:start, :stop) g
+            """,
+            {"prefix": BENCH_PREFIX, "start": existing + 1, "stop": total},
+        )
+    admin = dbsession.query(User).filter(User.user_name == "bench_admin").first()
+    if not admin:
+        admin = User(user_name="bench_admin", email="bench_admin@bench.local")
+        admin.user_permissions.append(UserPermission(perm_name="root_administration"))
+        admin.auth_tokens.append(AuthToken())
+        dbsession.add(admin)
+        dbsession.flush()
+    dbsession.execute("ANALYZE users")
+    return admin.auth_tokens[0].token
+
+
+def main(argv=sys.argv):
+    """
+    Measures latency of user search lookups through the API at large
+    table sizes, seeds benchmark users if they are missing
+    """
+    if len(argv) < 2:
+        usage(argv)
+    config_uri = argv[1]
+    options = parse_vars(argv[2:])
+    total = int(options.pop("users", 1000000))
+    repeat = int(options.pop("requests", 20))
+    setup_logging(config_uri)
+    settings = get_appsettings(config_uri, name="testscaffold", options=options)
+
+    session_factory = get_session_factory(get_engine(settings))
+    dbsession = get_tm_session(session_factory, transaction.manager)
+    with transaction.manager:
+        token = seed_users(dbsession, total)
+
+    from testscaffold import main as app_factory
+
+    app = app_factory({}, **settings)
+    headers = {"x-testscaffold-auth-token": str(token)}
+    print("{} benchmark users, {} requests per lookup".format(total, repeat))
+    for label, params in LOOKUPS:
+        path = "/api/0.1/users?{}".format(parse.urlencode(params))
+        timings = []
+        for x in range(repeat):
+            request = Request.blank(path, headers=headers)
+            start = time.perf_counter()
+            response = request.get_response(app)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                print("{} failed with {}".format(path, response.status))
+                sys.exit(1)
+        timings.sort()
+        print(
+            "{:<30} median {:8.2f}ms  p95 {:8.2f}ms  max {:8.2f}ms  total-count {}".format(
+                label,
+                statistics.median(timings),
+                timings[max(int(len(timings) * 0.95) - 1, 0)],
+                timings[-1],
+                response.headers.get("x-total-count"),
+            )
+        )
@@ -4,13 +4,13 @@ from pyramid.authentication import CallbackAuthenticationPolicy
 from pyramid.exceptions import HTTPNotFound
 from pyramid.interfaces import IAuthenticationPolicy
 from pyramid.security import Allow, ALL_PERMISSIONS
-from ziggurat_foundations.permissions import permission_to_pyramid_acls
 from zope.interface import implementer
 
 from testscaffold.services.resource import ResourceService
 from testscaffold.services.auth_token import AuthTokenService
 from testscaffold.services.user import UserService
 from testscaffold.util import safe_integer
+from testscaffold.util.request import count_permission_queries, resolve_effective_permissions
 
 log = logging.getLogger(__name__)
 
@@ -19,24 +19,30 @@ def groupfinder(userid, request):
     # registers _reified_user_obj that will be grabbed later by request.user property
     # we cache it so we don't have to query the db more than once
     if not getattr(request, "_reified_user_obj", None) and userid:
-        user = UserService.get(userid, db_session=request.dbsession)
+        user = UserService.get_for_auth(userid, db_session=request.dbsession)
         request._reified_user_obj = user
     elif userid:
         user = request._reified_user_obj
     if user:
-        groups = ["group:%s" % g.id for g in user.groups]
+        snapshot = resolve_effective_permissions(request, user)
+        groups = ["group:%s" % group_id for group_id in snapshot.group_ids]
         return groups
 
 
 @implementer(IAuthenticationPolicy)
 class PyramidSelectorPolicy:
-    def __init__(self, policy_selector=None, policies=None):
+    def __init__(self, policy_selector=None, policies=None, log_selection=False):
         """
         Policy factory - a callable that accepts argument ``request`` and
-        decides which policy instance should be returned based on that.
-        That name will be added to request object as an attribute ``matched_auth_policy``.
+        decides which policy should be used based on that. It can return
+        a key from ``policies`` or a policy instance directly.
+        Policy key will be added to request object as an attribute ``matched_auth_policy``.
         The factory should always return a policy.
 
+        Selection is done once per request and stored on the request object,
+        so the selector is not re-run for every ``effective_principals``,
+        ``authenticated_userid`` etc. call.
+
         Example usage::
 
             auth_tkt = AuthTktAuthenticationPolicy(...)
@@ -48,7 +54,6 @@ class PyramidSelectorPolicy:
                 # return API token policy if header is present
                 if request.headers.get("x-testscaffold-auth-token"):
                     policy = "auth_token_policy"
-                log.info("Policy used: {}".format(policy))
                 return policy
 
             auth_policy = PyramidSelectorPolicy(
@@ -60,16 +65,31 @@ class PyramidSelectorPolicy:
             )
             Configurator(settings=settings, authentication_policy=auth_policy,...)
 
-        :param policy_factory:
+        :param policy_selector:
+        :param policies:
+        :param log_selection: log selected policy (once per request)
         """
         self.policy_selector = policy_selector
-        self.policies = policies
-
-    def _get_policy(self, request, policy_key):
-        if policy_key not in self.policies:
-            raise ValueError("Policy {} is not found in PyramidSelectorPolicy".format(policy_key))
+        self.policies = policies or {}
+        self.log_selection = log_selection
+
+    def _get_policy(self, request):
+        policy = getattr(request, "_selected_auth_policy", None)
+        if policy is not None:
+            return policy
+        selected = self.policy_selector(request)
+        if isinstance(selected, str):
+            if selected not in self.policies:
+                raise ValueError("Policy {} is not found in PyramidSelectorPolicy".format(selected))
+            policy_key, policy = selected, self.policies[selected]
+        else:
+            policy = selected
+            policy_key = next((k for k, v in self.policies.items() if v is policy), policy.__class__.__name__)
         request.matched_auth_policy = policy_key
-        return self.policies[policy_key]
+        request._selected_auth_policy = policy
+        if self.log_selection:
+            log.info("Policy used: {}".format(policy_key))
+        return policy
 
     def authenticated_userid(self, request):
         """ Return the authenticated :term:`userid` or ``None`` if
@@ -80,7 +100,7 @@ class PyramidSelectorPolicy:
         the current id does not exist in a persistent store, it
         should return ``None``.
         """
-        policy = self._get_policy(request, self.policy_selector(request))
+        policy = self._get_policy(request)
         return policy.authenticated_userid(request)
 
     def unauthenticated_userid(self, request):
@@ -96,7 +116,7 @@ class PyramidSelectorPolicy:
         of the request data, abstracting away the specific headers,
         query strings, etc that are used to authenticate the request.
         """
-        policy = self._get_policy(request, self.policy_selector(request))
+        policy = self._get_policy(request)
         return policy.unauthenticated_userid(request)
 
     def effective_principals(self, request):
@@ -106,7 +126,7 @@ class PyramidSelectorPolicy:
         as ``pyramid.security.Everyone`` and
         ``pyramid.security.Authenticated``.
         """
-        policy = self._get_policy(request, self.policy_selector(request))
+        policy = self._get_policy(request)
         return policy.effective_principals(request)
 
     def remember(self, request, userid, **kw):
@@ -115,14 +135,14 @@ class PyramidSelectorPolicy:
         individual authentication policy and its consumers can
         decide on the composition and meaning of **kw.
         """
-        policy = self._get_policy(request, self.policy_selector(request))
+        policy = self._get_policy(request)
         return policy.remember(request, userid, **kw)
 
     def forget(self, request):
         """ Return a set of headers suitable for 'forgetting' the
         current user on subsequent requests.
         """
-        policy = self._get_policy(request, self.policy_selector(request))
+        policy = self._get_policy(request)
         return policy.forget(request)
 
 
@@ -139,13 +159,12 @@ class AuthTokenAuthenticationPolicy(CallbackAuthenticationPolicy):
     def unauthenticated_userid(self, request):
         token = "{}".format(request.headers.get("x-testscaffold-auth-token", ""))
         if token:
-            auth_token = AuthTokenService.by_token(token, db_session=request.dbsession)
-            if auth_token:
+            owner_id = AuthTokenService.owner_id_by_token(token, db_session=request.dbsession)
+            if owner_id:
                 log.info(
-                    "AuthTokenAuthenticationPolicy.unauthenticated_userid",
-                    extra={"found": True, "owner": auth_token.owner_id},
+                    "AuthTokenAuthenticationPolicy.unauthenticated_userid", extra={"found": True, "owner": owner_id},
                 )
-                return auth_token.owner_id
+                return owner_id
             log.info(
                 "AuthTokenAuthenticationPolicy.unauthenticated_userid", extra={"found": False, "owner": None},
             )
@@ -165,11 +184,9 @@ def allow_root_access(request, context):
     """
     Adds ALL_PERMISSIONS to every resource if user has 'root_permission'
     """
-    if getattr(request, "user"):
-        permissions = UserService.permissions(request.user)
-        for perm in permission_to_pyramid_acls(permissions):
-            if perm[2] == "root_administration":
-                context.__acl__.append((perm[0], perm[1], ALL_PERMISSIONS))
+    snapshot = request.effective_permissions
+    if snapshot and snapshot.root_admin:
+        context.__acl__.append((Allow, snapshot.user_id, ALL_PERMISSIONS))
 
 
 def object_security_factory(request):
@@ -197,12 +214,12 @@ class RootFactory:
     def __init__(self, request):
         self.__acl__ = []
         # general page factory - append custom non resource permissions
-        if getattr(request, "user"):
-            permissions = UserService.permissions(request.user, db_session=request.dbsession)
+        snapshot = request.effective_permissions
+        if snapshot:
             has_admin_panel_access = False
             panel_perms = ["admin_panel", ALL_PERMISSIONS]
-            for outcome, perm_user, perm_name in permission_to_pyramid_acls(permissions):
-                perm_tuple = rewrite_root_perm(outcome, perm_user, perm_name)
+            for principal, perm_name in snapshot.permissions:
+                perm_tuple = rewrite_root_perm(Allow, principal, perm_name)
                 if perm_tuple[0] is Allow and perm_tuple[2] in panel_perms:
                     has_admin_panel_access = True
                 self.__acl__.append(perm_tuple)
@@ -225,12 +242,16 @@ class DefaultResourceFactory:
         if self.resource:
             self.__acl__ = self.resource.__acl__
 
-        if self.resource and request.user:
+        snapshot = request.effective_permissions
+        if self.resource and snapshot:
             # add perms that this user has for this resource
             # this is a big performance optimization - we fetch only data
             # needed to check one specific user
-            permissions = ResourceService.perms_for_user(self.resource, request.user)
-            for outcome, perm_user, perm_name in permission_to_pyramid_acls(permissions):
-                self.__acl__.append(rewrite_root_perm(outcome, perm_user, perm_name))
+            permissions = ResourceService.acl_rows_for_principals(
+                self.resource, snapshot.user_id, snapshot.group_ids, db_session=request.dbsession
+            )
+            count_permission_queries(request)
+            for principal, perm_name in permissions:
+                self.__acl__.append(rewrite_root_perm(Allow, principal, perm_name))
 
         allow_root_access(request, context=self)
@@ -1,14 +1,71 @@
+import hashlib
 import logging
 
+import sqlalchemy as sa
+from dogpile.cache.api import NO_VALUE
 from ziggurat_foundations.models.base import get_db_session
 
 from testscaffold.models.db import AuthToken
+from testscaffold.util.cache_regions import TieredCache
 
 log = logging.getLogger(__name__)
 
 
 class AuthTokenService:
+    # token -> owner_id, redis only so deleted tokens are rejected by every process straight away
+    owner_cache = TieredCache("auth_token_owner", region="redis_min_5", local_maxsize=0)
+    # tokens that are not present in db, kept briefly to stop random token floods
+    missing_cache = TieredCache("auth_token_missing", region="redis_sec_5", local_maxsize=10000, local_ttl=5)
+
     @classmethod
     def by_token(cls, token, db_session=None):
         db_session = get_db_session(db_session)
         return db_session.query(AuthToken).filter(AuthToken.token == token).first()
+
+    @classmethod
+    def by_id_and_owner(cls, token_id, owner_id, db_session=None):
+        db_session = get_db_session(db_session)
+        query = db_session.query(AuthToken).filter(AuthToken.id == token_id)
+        return query.filter(AuthToken.owner_id == owner_id).first()
+
+    @staticmethod
+    def cache_key(token):
+        # never store raw tokens in redis
+        return hashlib.sha1(token.encode("utf8")).hexdigest()
+
+    @classmethod
+    def owner_id_by_token(cls, token, db_session=None):
+        """
+        Returns id of token owner or None, uses redis cache (and in-process
+        cache for missing tokens) before hitting the database
+        """
+        key = cls.cache_key(token)
+        owner_id = cls.owner_cache.get(key)
+        if owner_id is not NO_VALUE:
+            return owner_id
+        if cls.missing_cache.get(key) is not NO_VALUE:
+            return None
+        auth_token = cls.by_token(token, db_session=db_session)
+        if auth_token:
+            cls.owner_cache.set(key, auth_token.owner_id)
+            return auth_token.owner_id
+        cls.missing_cache.set(key, True)
+        return None
+
+    @classmethod
+    def invalidate(cls, token, db_session=None):
+        key = cls.cache_key(token)
+        cls.owner_cache.delete_on_commit(key, db_session=db_session)
+        cls.missing_cache.delete_on_commit(key, db_session=db_session)
+
+    @classmethod
+    def invalidate_for_user(cls, user, db_session=None):
+        db_session = get_db_session(db_session, user)
+        for auth_token in user.auth_tokens:
+            cls.invalidate(auth_token.token, db_session=db_session)
+
+
+@sa.event.listens_for(AuthToken, "after_insert")
+@sa.event.listens_for(AuthToken, "after_delete")
+def _auth_token_changed(mapper, connection, target):
+    AuthTokenService.invalidate(target.token, db_session=sa.orm.object_session(target))
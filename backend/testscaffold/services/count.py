@@ -0,0 +1,87 @@
+import hashlib
+import logging
+
+import sqlalchemy as sa
+
+import testscaffold.util.cache_regions as cache_regions
+
+log = logging.getLogger(__name__)
+
+COUNT_MODES = ("exact", "cached", "estimate")
+
+# region used by `cached` count mode
+COUNT_CACHE_REGION = "redis_min_1"
+
+
+class CountService:
+    """
+    Provides total row counts for paginated lists:
+
+    * exact - plain COUNT(*)
+    * cached - COUNT(*) stored in dogpile region for a minute
+    * estimate - postgres planner estimate, pg_class.reltuples for whole
+      tables or EXPLAIN row estimate for filtered queries
+    """
+
+    @classmethod
+    def mode_for(cls, settings, name):
+        """ reads `count_mode.<name>` setting """
+        mode = settings.get("count_mode.{}".format(name), "exact")
+        if mode not in COUNT_MODES:
+            raise ValueError("Unknown count mode {} for {}".format(mode, name))
+        return mode
+
+    @classmethod
+    def count(cls, query, mode="exact"):
+        """
+        Returns tuple of (count, mode) - mode can differ from requested one
+        if it was not possible to use it
+        """
+        query = query.order_by(None)
+        if mode == "estimate":
+            estimate = cls.estimate(query)
+            if estimate is not None:
+                return estimate, mode
+            mode = "exact"
+        if mode == "cached":
+            if cache_regions.regions is not None:
+                region = cache_regions.get_region(COUNT_CACHE_REGION)
+                return region.get_or_create(cls.cache_key(query), query.count), mode
+            mode = "exact"
+        return query.count(), mode
+
+    @classmethod
+    def cache_key(cls, query):
+        compiled = query.statement.compile()
+        source = "{}|{}".format(compiled, sorted(compiled.params.items()))
+        return "count:{}".format(hashlib.sha1(source.encode("utf8")).hexdigest())
+
+    @classmethod
+    def estimate(cls, query):
+        db_session = query.session
+        if db_session.bind.dialect.name != "postgresql":
+            return None
+        if query.whereclause is None:
+            tables = query.statement.froms
+            if len(tables) == 1 and isinstance(tables[0], sa.Table):
+                return cls.table_estimate(tables[0].name, db_session)
+        return cls.plan_estimate(query, db_session)
+
+    @classmethod
+    def table_estimate(cls, table_name, db_session):
+        """ planner statistics for whole table, None if table was never analyzed """
+        result = db_session.execute(
+            sa.text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+            {"table_name": table_name},
+        ).scalar()
+        if result is None or result < 0:
+            return None
+        return result
+
+    @classmethod
+    def plan_estimate(cls, query, db_session):
+        # expanding IN parameters have to be rendered for raw driver execution
+        compiled = query.statement.compile(dialect=db_session.bind.dialect, compile_kwargs={"render_postcompile": True})
+        statement = "EXPLAIN (FORMAT JSON) {}".format(compiled)
+        result = db_session.connection().exec_driver_sql(statement, compiled.params).scalar()
+        return int(result[0]["Plan"]["Plan Rows"])
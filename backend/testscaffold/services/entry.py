@@ -1,13 +1,21 @@
 import logging
 
+import sqlalchemy as sa
 from paginate_sqlalchemy import SqlalchemyOrmPage
 from ziggurat_foundations.models.base import get_db_session
 from ziggurat_foundations.models.services.resource import ResourceService as RService
 
 from testscaffold.models.db import Entry
+from testscaffold.services.count import CountService
+from testscaffold.services.resource import ResourceService
+from testscaffold.util import escape_like, safe_integer
+from testscaffold.util.pagination import KeysetPage
 
 log = logging.getLogger(__name__)
 
+# must match text search configuration used by entries_search_vector_update trigger
+SEARCH_CONFIG = "english"
+
 
 class EntryService(RService):
     @classmethod
@@ -20,16 +28,104 @@ class EntryService(RService):
         return query.get(entry_id)
 
     @classmethod
-    def total_count(cls, db_session=None):
+    def total_count(cls, db_session=None, count_mode="exact"):
+        db_session = get_db_session(db_session)
+        item_count, _ = CountService.count(db_session.query(Entry), mode=count_mode)
+        return item_count
+
+    @classmethod
+    def filter_query(cls, query, filter_params):
+        """
+        Narrows entries query, supported params:
+        `resource_name_like` (prefix), `parent_id`, `owner_user_id`, `note` (contains)
+        """
+        resource_name_like = filter_params.get("resource_name_like")
+        if resource_name_like:
+            query = query.filter(Entry.resource_name.like(escape_like(resource_name_like) + "%", escape="\\"))
+        parent_id = filter_params.get("parent_id")
+        if parent_id:
+            query = query.filter(Entry.parent_id == safe_integer(parent_id))
+        owner_user_id = filter_params.get("owner_user_id")
+        if owner_user_id:
+            query = query.filter(Entry.owner_user_id == safe_integer(owner_user_id))
+        note = filter_params.get("note")
+        if note:
+            query = query.filter(Entry.note.ilike("%" + escape_like(note) + "%", escape="\\"))
+        return query
+
+    @classmethod
+    def collection_version(cls, filter_params=None, db_session=None):
+        """
+        (latest updated_date, count) of filtered entries, count changes
+        when rows are removed so both are needed to detect changes
+        """
         db_session = get_db_session(db_session)
-        return db_session.query(Entry).count()
+        query = db_session.query(sa.func.max(Entry.updated_date), sa.func.count(Entry.resource_id)).select_from(Entry)
+        return tuple(cls.filter_query(query, filter_params or {}).one())
 
     @classmethod
-    def get_paginator(cls, page=1, item_count=None, items_per_page=50, db_session=None, filter_params=None, **kwargs):
-        """ returns paginator over users belonging to the group"""
+    def export_query(cls, filter_params=None, db_session=None):
+        """ filtered entries in stable order, same filters as `get_paginator` """
+        db_session = get_db_session(db_session)
+        query = cls.filter_query(db_session.query(Entry), filter_params or {})
+        return query.order_by(Entry.resource_id)
+
+    @classmethod
+    def get_paginator(
+        cls,
+        page=1,
+        item_count=None,
+        items_per_page=50,
+        db_session=None,
+        filter_params=None,
+        cursor=None,
+        with_count=False,
+        count_mode="exact",
+        **kwargs,
+    ):
+        """
+        returns paginator over entries, passing `cursor` (can be empty string
+        for first page) switches to keyset pagination without OFFSET,
+        `count_mode` selects how total count is computed
+        """
         if filter_params is None:
             filter_params = {}
         db_session = get_db_session(db_session)
-        query = db_session.query(Entry)
+        query = cls.filter_query(db_session.query(Entry), filter_params)
         query = query.order_by(Entry.resource_id)
-        return SqlalchemyOrmPage(query, page=page, item_count=item_count, items_per_page=items_per_page, **kwargs)
+        if cursor is not None:
+            if with_count and item_count is None:
+                item_count, count_mode = CountService.count(query, mode=count_mode)
+            return KeysetPage(
+                query,
+                Entry.resource_id,
+                cursor=cursor,
+                items_per_page=items_per_page,
+                item_count=item_count,
+                count_mode=count_mode if item_count is not None else None,
+            )
+        if item_count is None:
+            item_count, count_mode = CountService.count(query, mode=count_mode)
+        paginator = SqlalchemyOrmPage(query, page=page, item_count=item_count, items_per_page=items_per_page, **kwargs)
+        paginator.count_mode = count_mode
+        return paginator
+
+    @classmethod
+    def search(cls, terms, snapshot, page=1, items_per_page=50, count_mode="exact", db_session=None, **kwargs):
+        """
+        Ranked full text search over resource_name and note, returns paginator
+        over (entry, rank) rows limited to entries `snapshot` owner can view
+        """
+        db_session = get_db_session(db_session)
+        tsquery = sa.func.websearch_to_tsquery(SEARCH_CONFIG, terms)
+        rank = sa.func.ts_rank_cd(Entry.search_vector, tsquery).label("rank")
+        query = db_session.query(Entry, rank).filter(Entry.search_vector.op("@@")(tsquery))
+        if not snapshot.root_admin:
+            query = query.filter(
+                ResourceService.permitted_filter(Entry, snapshot.user_id, snapshot.group_ids, perm_names=["view"])
+            )
+        item_count, count_mode = CountService.count(query, mode=count_mode)
+        query = query.order_by(rank.desc(), Entry.resource_id)
+        paginator = SqlalchemyOrmPage(query, page=page, item_count=item_count, items_per_page=items_per_page, **kwargs)
+        paginator.count_mode = count_mode
+        return paginator
@@ -0,0 +1,231 @@
+import logging
+
+import sqlalchemy as sa
+from ziggurat_foundations.models.base import get_db_session
+
+from testscaffold.models.db import Entry, Resource
+from testscaffold.services.resource import ResourceService
+from testscaffold.services.resource_tree_service import tree_service
+
+log = logging.getLogger(__name__)
+
+
+class EntryBulkService:
+    """
+    Applies many create/patch/move operations in one transaction. Sibling
+    positions are computed in memory and written once per affected parent
+    instead of shifting rows after every single operation.
+    """
+
+    @classmethod
+    def apply(cls, operations, owner, snapshot, db_session=None):
+        """
+        `operations` are dicts loaded by EntryBulkOperationSchema.
+        Returns (results, errors) - errors map operation index to messages,
+        caller has to abort the transaction if there are any.
+        """
+        db_session = get_db_session(db_session)
+        target_ids = set(op["resource_id"] for op in operations if op["op"] != "create")
+        targets = cls.load_targets(target_ids, db_session)
+        allowed_ids = cls.allowed_ids(target_ids, snapshot, db_session)
+        new_parent_ids = set(op["parent_id"] for op in operations if op.get("parent_id") is not None)
+        existing_parent_ids = cls.existing_ids(new_parent_ids, db_session)
+
+        errors = {}
+        for index, op in enumerate(operations):
+            if op["op"] != "create":
+                if op["resource_id"] not in targets:
+                    errors[index] = {"resource_id": ["Entry not found"]}
+                elif op["resource_id"] not in allowed_ids:
+                    errors[index] = {"resource_id": ["Not allowed to modify this entry"]}
+            if op.get("parent_id") is not None and op["parent_id"] not in existing_parent_ids:
+                errors.setdefault(index, {})["parent_id"] = ["New parent node not found"]
+        if errors:
+            return None, errors
+
+        affected_parents = set(op.get("parent_id") for op in operations if op["op"] == "create" or "parent_id" in op)
+        affected_parents.update(
+            resource.parent_id
+            for resource_id, resource in targets.items()
+            if any(op.get("resource_id") == resource_id and cls.is_move(op) for op in operations)
+        )
+        children, orderings = cls.load_children(affected_parents, db_session)
+        parent_of = {resource_id: resource.parent_id for resource_id, resource in targets.items()}
+        for parent_id, siblings in children.items():
+            parent_of.update((resource_id, parent_id) for resource_id in siblings)
+
+        new_ids = cls.allocate_ids(len([op for op in operations if op["op"] == "create"]), db_session)
+        created = []
+        results = []
+        for index, op in enumerate(operations):
+            if op["op"] == "create":
+                resource_id = next(new_ids)
+                parent_id = op.get("parent_id")
+                if not cls.insert_at(children[parent_id], resource_id, op.get("ordering")):
+                    errors[index] = {"ordering": ["Position is out of bounds"]}
+                parent_of[resource_id] = parent_id
+                created.append((resource_id, op))
+            else:
+                resource_id = op["resource_id"]
+                resource = targets[resource_id]
+                if op["op"] == "patch":
+                    for key in ("resource_name", "note"):
+                        if key in op:
+                            setattr(resource, key, op[key])
+                if cls.is_move(op):
+                    error = cls.move(resource_id, op, children, parent_of, db_session)
+                    if error:
+                        errors[index] = error
+                        continue
+                    resource.parent_id = parent_of[resource_id]
+            results.append({"op": op["op"], "resource_id": resource_id})
+        if errors:
+            return None, errors
+
+        positions = {}
+        for siblings in children.values():
+            positions.update((resource_id, position) for position, resource_id in enumerate(siblings, 1))
+
+        for result in results:
+            resource_id = result["resource_id"]
+            result["parent_id"] = parent_of[resource_id]
+            # siblings of patched but not moved entries are not loaded, their ordering is unchanged
+            result["ordering"] = positions[resource_id] if resource_id in positions else targets[resource_id].ordering
+
+        # parent changes go first so path triggers see final parents of inserted rows
+        db_session.flush()
+        cls.insert_entries(created, owner, parent_of, positions, db_session)
+        cls.update_orderings(positions, orderings, db_session)
+        for resource in targets.values():
+            db_session.expire(resource, ["ordering"])
+        tree_service.invalidate(db_session=db_session)
+        log.info("entries_bulk", extra={"operations": len(operations), "created": len(created)})
+        return results, None
+
+    @staticmethod
+    def is_move(op):
+        return op["op"] != "create" and ("parent_id" in op or "ordering" in op)
+
+    @staticmethod
+    def insert_at(siblings, resource_id, ordering):
+        """ places node in sibling list, appends if ordering is not set """
+        if ordering is None:
+            siblings.append(resource_id)
+            return True
+        if not 1 <= ordering <= len(siblings) + 1:
+            return False
+        siblings.insert(ordering - 1, resource_id)
+        return True
+
+    @classmethod
+    def move(cls, resource_id, op, children, parent_of, db_session):
+        old_parent_id = parent_of[resource_id]
+        new_parent_id = op["parent_id"] if "parent_id" in op else old_parent_id
+        if new_parent_id != old_parent_id and cls.is_descendant(new_parent_id, resource_id, parent_of, db_session):
+            return {"parent_id": ["Trying to insert node into itself"]}
+        children[old_parent_id].remove(resource_id)
+        if not cls.insert_at(children[new_parent_id], resource_id, op.get("ordering")):
+            children[old_parent_id].append(resource_id)
+            return {"ordering": ["Position is out of bounds"]}
+        parent_of[resource_id] = new_parent_id
+        return None
+
+    @classmethod
+    def is_descendant(cls, node_id, resource_id, parent_of, db_session):
+        """ walks up from node_id, uses parents changed by this batch first """
+        while node_id is not None:
+            if node_id == resource_id:
+                return True
+            if node_id not in parent_of:
+                query = db_session.query(Resource.parent_id).filter(Resource.resource_id == node_id)
+                parent_of[node_id] = query.scalar()
+            node_id = parent_of[node_id]
+        return False
+
+    @classmethod
+    def load_targets(cls, resource_ids, db_session):
+        if not resource_ids:
+            return {}
+        query = db_session.query(Entry).filter(Entry.resource_id.in_(resource_ids)).with_for_update()
+        return {entry.resource_id: entry for entry in query}
+
+    @classmethod
+    def allowed_ids(cls, resource_ids, snapshot, db_session):
+        if not resource_ids or snapshot.root_admin:
+            return resource_ids
+        query = db_session.query(Resource.resource_id).filter(Resource.resource_id.in_(resource_ids))
+        query = query.filter(
+            ResourceService.permitted_filter(Resource, snapshot.user_id, snapshot.group_ids, perm_names=["owner"])
+        )
+        return set(row.resource_id for row in query)
+
+    @classmethod
+    def existing_ids(cls, resource_ids, db_session):
+        if not resource_ids:
+            return set()
+        query = db_session.query(Resource.resource_id).filter(Resource.resource_id.in_(resource_ids))
+        return set(row.resource_id for row in query)
+
+    @classmethod
+    def load_children(cls, parent_ids, db_session):
+        """ returns ({parent_id: [child ids in order]}, {child_id: current ordering}) """
+        children = dict((parent_id, []) for parent_id in parent_ids)
+        orderings = {}
+        criteria = []
+        if parent_ids - {None}:
+            criteria.append(Resource.parent_id.in_(parent_ids - {None}))
+        if None in parent_ids:
+            criteria.append(Resource.parent_id.is_(None))
+        if not criteria:
+            return children, orderings
+        query = db_session.query(Resource.resource_id, Resource.parent_id, Resource.ordering)
+        query = query.filter(sa.or_(*criteria)).order_by(Resource.ordering, Resource.resource_id)
+        for row in query.with_for_update():
+            children[row.parent_id].append(row.resource_id)
+            orderings[row.resource_id] = row.ordering
+        return children, orderings
+
+    @classmethod
+    def allocate_ids(cls, count, db_session):
+        """ reserves primary keys upfront so rows can be inserted with executemany """
+        if not count:
+            return iter(())
+        query = sa.text(
+            "SELECT nextval(pg_get_serial_sequence('resources', 'resource_id')) FROM generate_series(1, :count)"
+        )
+        return iter([row[0] for row in db_session.execute(query, {"count": count})])
+
+    @classmethod
+    def insert_entries(cls, created, owner, parent_of, positions, db_session):
+        if not created:
+            return
+        resource_rows = []
+        entry_rows = []
+        for resource_id, op in created:
+            resource_rows.append(
+                {
+                    "resource_id": resource_id,
+                    "resource_name": op["resource_name"],
+                    "resource_type": Entry.__mapper_args__["polymorphic_identity"],
+                    "parent_id": parent_of[resource_id],
+                    "ordering": positions[resource_id],
+                    "owner_user_id": owner.id,
+                }
+            )
+            entry_rows.append({"resource_id": resource_id, "note": op.get("note")})
+        db_session.execute(Resource.__table__.insert(), resource_rows)
+        db_session.execute(Entry.__table__.insert(), entry_rows)
+
+    @classmethod
+    def update_orderings(cls, positions, orderings, db_session):
+        """ single executemany for every sibling whose position changed """
+        changed = [
+            {"b_resource_id": resource_id, "b_ordering": position}
+            for resource_id, position in positions.items()
+            if resource_id in orderings and orderings[resource_id] != position
+        ]
+        if not changed:
+            return
+        table = Resource.__table__
+        statement = table.update().where(table.c.resource_id == sa.bindparam("b_resource_id"))
+        db_session.execute(statement.values(ordering=sa.bindparam("b_ordering")), changed)
@@ -5,6 +5,7 @@ from ziggurat_foundations.models.base import get_db_session
 from ziggurat_foundations.models.services.group import GroupService as GService
 
 from testscaffold.models.db import Group
+from testscaffold.util.sqlalchemy import identity_map_value
 
 log = logging.getLogger(__name__)
 
@@ -19,6 +20,17 @@ class GroupService(GService):
         query = db_session.query(cls.model)
         return query.get(group_id)
 
+    @classmethod
+    def version(cls, group_id, db_session=None):
+        """ `updated_date` of group without loading the object, None if it does not exist """
+        if not group_id:
+            return None
+        db_session = get_db_session(db_session)
+        updated_date = identity_map_value(db_session, cls.model, group_id, "updated_date")
+        if updated_date is not None:
+            return updated_date
+        return db_session.query(cls.model.updated_date).filter(cls.model.id == group_id).scalar()
+
     @classmethod
     def by_id(cls, group_id, db_session=None):
         """ fetch user by user id """
@@ -27,6 +39,15 @@ class GroupService(GService):
         query = query.filter(cls.model.id == group_id)
         return query.first()
 
+    @classmethod
+    def by_ids(cls, group_ids, db_session=None):
+        """ fetch groups by ids in a single query """
+        group_ids = set(group_id for group_id in group_ids if group_id)
+        if not group_ids:
+            return []
+        db_session = get_db_session(db_session)
+        return db_session.query(cls.model).filter(cls.model.id.in_(group_ids)).all()
+
     @classmethod
     def get_paginator(cls, page=1, item_count=None, items_per_page=50, db_session=None, **kwargs):
         """ returns paginator over users belonging to the group"""
@@ -0,0 +1,74 @@
+import logging
+from collections import namedtuple
+
+from dogpile.cache.api import NO_VALUE
+from ziggurat_foundations.models.base import get_db_session
+
+from testscaffold.models.db import UserGroup
+from testscaffold.services.user import UserService
+from testscaffold.util.cache_regions import TieredCache
+
+log = logging.getLogger(__name__)
+
+# bump when PermissionSnapshot structure changes so old cached entries are ignored
+SNAPSHOT_VERSION = 1
+
+# queries run by `PermissionSnapshotService.build` - permissions union,
+# user groups are expected to be loaded by `UserService.get_for_auth`
+BUILD_QUERY_COUNT = 1
+
+# compiled non-resource permissions of a user, `permissions` holds
+# (principal, perm_name) pairs where principal is user id or "group:<id>"
+PermissionSnapshot = namedtuple("PermissionSnapshot", ["version", "user_id", "group_ids", "permissions", "root_admin"])
+
+
+class PermissionSnapshotService:
+    cache = TieredCache("permission_snapshot", region="redis_min_60", local_maxsize=10000, local_ttl=5)
+
+    @classmethod
+    def build(cls, user, db_session=None):
+        db_session = get_db_session(db_session, user)
+        group_ids = tuple(sorted(g.id for g in user.groups))
+        permissions = []
+        for perm in UserService.permissions(user, db_session=db_session):
+            if perm.type == "user":
+                permissions.append((user.id, perm.perm_name))
+            elif perm.type == "group":
+                permissions.append(("group:%s" % perm.group.id, perm.perm_name))
+        root_admin = any(perm_name == "root_administration" for _, perm_name in permissions)
+        return PermissionSnapshot(SNAPSHOT_VERSION, user.id, group_ids, tuple(permissions), root_admin)
+
+    @classmethod
+    def get_cached(cls, user_id):
+        snapshot = cls.cache.get(user_id)
+        if snapshot is NO_VALUE or snapshot.version != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    @classmethod
+    def store(cls, snapshot):
+        cls.cache.set(snapshot.user_id, snapshot)
+
+    @classmethod
+    def for_user(cls, user, db_session=None):
+        """
+        Returns cached permission snapshot for user, builds it on cache miss
+        """
+        snapshot = cls.get_cached(user.id)
+        if snapshot is None:
+            snapshot = cls.build(user, db_session=db_session)
+            cls.store(snapshot)
+        return snapshot
+
+    @classmethod
+    def invalidate(cls, user_id, db_session=None):
+        log.debug("permission_snapshot_invalidate", extra={"user_id": user_id})
+        cls.cache.delete_on_commit(user_id, db_session=db_session)
+
+    @classmethod
+    def invalidate_group(cls, group_id, db_session=None):
+        """ invalidates snapshots of every member of the group """
+        db_session = get_db_session(db_session)
+        query = db_session.query(UserGroup.user_id).filter(UserGroup.group_id == group_id)
+        for row in query:
+            cls.invalidate(row.user_id, db_session=db_session)
@@ -1,5 +1,55 @@
+import sqlalchemy as sa
+from ziggurat_foundations.models.base import get_db_session
 from ziggurat_foundations.models.services.resource import ResourceService
 
+from testscaffold.models.db import GroupResourcePermission, UserResourcePermission
+
 
 class ResourceService(ResourceService):
-    pass
+    @classmethod
+    def acl_rows_for_principals(cls, instance, user_id, group_ids, db_session=None):
+        """
+        Returns (principal, perm_name) tuples that user or his groups were
+        granted directly for this resource, unlike `perms_for_user` it doesn't
+        need `user.groups` relationship to be loaded. Ownership is already
+        part of `instance.__acl__`.
+        """
+        db_session = get_db_session(db_session, instance)
+        query = db_session.query(
+            UserResourcePermission.user_id.label("owner_id"),
+            UserResourcePermission.perm_name,
+            sa.literal("user").label("type"),
+        )
+        query = query.filter(UserResourcePermission.user_id == user_id)
+        query = query.filter(UserResourcePermission.resource_id == instance.resource_id)
+        if group_ids:
+            query2 = db_session.query(
+                GroupResourcePermission.group_id.label("owner_id"),
+                GroupResourcePermission.perm_name,
+                sa.literal("group").label("type"),
+            )
+            query2 = query2.filter(GroupResourcePermission.group_id.in_(group_ids))
+            query2 = query2.filter(GroupResourcePermission.resource_id == instance.resource_id)
+            query = query.union(query2)
+        return [(row.owner_id if row.type == "user" else "group:%s" % row.owner_id, row.perm_name) for row in query]
+
+    @classmethod
+    def permitted_filter(cls, model, user_id, group_ids, perm_names):
+        """
+        SQL criterion matching resources of `model` that user owns or was
+        granted any of `perm_names` directly or through groups, lets lists
+        apply ACL in the database instead of checking rows one by one
+        """
+        user_perms = sa.select([UserResourcePermission.resource_id]).where(
+            sa.and_(UserResourcePermission.user_id == user_id, UserResourcePermission.perm_name.in_(perm_names))
+        )
+        criteria = [model.owner_user_id == user_id, model.resource_id.in_(user_perms)]
+        if group_ids:
+            group_perms = sa.select([GroupResourcePermission.resource_id]).where(
+                sa.and_(
+                    GroupResourcePermission.group_id.in_(group_ids), GroupResourcePermission.perm_name.in_(perm_names)
+                )
+            )
+            criteria.append(model.owner_group_id.in_(group_ids))
+            criteria.append(model.resource_id.in_(group_perms))
+        return sa.or_(*criteria)
@@ -1,4 +1,204 @@
+import uuid
+from collections import OrderedDict, namedtuple
+
+import sqlalchemy as sa
+from dogpile.cache.api import NO_VALUE
+from pyramid.settings import asbool
+from ziggurat_foundations import noop
+from ziggurat_foundations.exc import ZigguratResourceTreeMissingException, ZigguratResourceTreePathException
+from ziggurat_foundations.models.base import get_db_session
+from ziggurat_foundations.models.services.resource import ResourceService
 from ziggurat_foundations.models.services.resource_tree import ResourceTreeService
 from ziggurat_foundations.models.services.resource_tree_postgres import ResourceTreeServicePostgreSQL
 
-tree_service = ResourceTreeService(ResourceTreeServicePostgreSQL)
+from testscaffold.models.db import Resource
+from testscaffold.util.cache_regions import TieredCache
+
+# detached, picklable copy of resource row used in cached trees
+TreeNode = namedtuple(
+    "TreeNode",
+    ["resource_id", "resource_name", "resource_type", "parent_id", "ordering", "owner_user_id", "owner_group_id"],
+)
+
+# entry of cached parent index, ordered like the tree
+TreeIndexNode = namedtuple("TreeIndexNode", ["resource_id", "parent_id", "depth", "resource_name"])
+
+# mimics rows returned by recursive `from_parent_deeper` query
+SubtreeRow = namedtuple("SubtreeRow", ["Resource", "depth", "sorting", "path"])
+
+
+def freeze_subtree(subtree):
+    """ converts `build_subtree_strut` result into structure with TreeNode nodes """
+    node = subtree["node"]
+    if node is not None:
+        node = TreeNode(*[getattr(node, field) for field in TreeNode._fields])
+    children = OrderedDict((key, freeze_subtree(child)) for key, child in subtree["children"].items())
+    return {"node": node, "children": children}
+
+
+class ResourceTreeServiceMaterializedPath(ResourceTreeServicePostgreSQL):
+    """
+    Reads tree structure from `resources.path_ids` (GIN indexed) instead of
+    recursive queries, mutations are inherited - triggers keep paths in sync
+    """
+
+    @classmethod
+    def from_parent_deeper(cls, parent_id=None, limit_depth=1000000, db_session=None, *args, **kwargs):
+        db_session = get_db_session(db_session)
+        path_length = sa.func.array_length(cls.model.path_ids, 1)
+        query = db_session.query(cls.model)
+        if parent_id:
+            query = query.filter(cls.model.path_ids.contains([parent_id]), cls.model.resource_id != parent_id)
+            query = query.filter(path_length - sa.func.array_position(cls.model.path_ids, parent_id) <= limit_depth)
+        else:
+            query = query.filter(path_length <= limit_depth)
+        resources = query.all()
+        orderings = {resource.resource_id: (resource.ordering, resource.resource_id) for resource in resources}
+        rows = []
+        for resource in resources:
+            # path relative to the starting parent like in recursive version
+            path = resource.path_ids[resource.path_ids.index(parent_id) + 1 :] if parent_id else resource.path_ids
+            sort_key = [orderings[resource_id] for resource_id in path]
+            row = SubtreeRow(
+                resource,
+                len(path),
+                "/".join("{:07d}".format(ordering) for ordering, _ in sort_key),
+                "/".join(str(resource_id) for resource_id in path),
+            )
+            rows.append((sort_key, row))
+        rows.sort(key=lambda item: item[0])
+        return [row for _, row in rows]
+
+    @classmethod
+    def path_upper(cls, object_id, limit_depth=1000000, db_session=None, *args, **kwargs):
+        db_session = get_db_session(db_session)
+        resource = db_session.query(cls.model).get(object_id) if object_id is not None else None
+        if resource is None:
+            return []
+        path_ids = list(reversed(resource.path_ids))[:limit_depth]
+        resources = db_session.query(cls.model).filter(cls.model.resource_id.in_(path_ids)).all()
+        by_id = {item.resource_id: item for item in resources}
+        return [by_id[resource_id] for resource_id in path_ids if resource_id in by_id]
+
+    @classmethod
+    def check_node_parent(cls, resource_id, new_parent_id, db_session=None, *args, **kwargs):
+        db_session = get_db_session(db_session)
+        new_parent = ResourceService.lock_resource_for_update(resource_id=new_parent_id, db_session=db_session)
+        # we are not moving to "root" so parent should be found
+        if not new_parent and new_parent_id is not None:
+            raise ZigguratResourceTreeMissingException("New parent node not found")
+        if new_parent and resource_id in (new_parent.path_ids or []):
+            raise ZigguratResourceTreePathException("Trying to insert node into itself")
+
+
+class CachedResourceTreeService(ResourceTreeService):
+    """
+    Serves subtrees from cache, every change of tree structure switches
+    cache generation so all cached branches are dropped at once
+    """
+
+    # current generation id, short local ttl so other processes pick up changes quickly
+    generation_cache = TieredCache("resource_tree_generation", region="redis_min_60", local_maxsize=1, local_ttl=1)
+    # trees never change for given generation so they can live longer locally
+    tree_cache = TieredCache("resource_tree", region="redis_min_60", local_maxsize=256, local_ttl=60)
+
+    def generation(self):
+        generation = self.generation_cache.get("current")
+        if generation is NO_VALUE:
+            generation = uuid.uuid4().hex
+            self.generation_cache.set("current", generation)
+        return generation
+
+    def invalidate(self, db_session=None):
+        self.generation_cache.delete_on_commit("current", db_session=db_session)
+
+    def cached_subtree(self, parent_id=None, limit_depth=1000000, db_session=None):
+        """
+        Same structure as `build_subtree_strut(from_parent_deeper(...))`
+        with TreeNode instances as nodes
+        """
+        key = "{}:{}:{}".format(self.generation(), parent_id, limit_depth)
+        tree = self.tree_cache.get(key)
+        if tree is NO_VALUE:
+            result = self.from_parent_deeper(parent_id, limit_depth=limit_depth, db_session=db_session)
+            tree = freeze_subtree(self.build_subtree_strut(result))
+            self.tree_cache.set(key, tree)
+        return tree
+
+    def cached_index(self, db_session=None):
+        """
+        OrderedDict of resource_id -> TreeIndexNode for the whole tree in
+        display order, lightweight alternative to loading all resources
+        """
+        key = "{}:index".format(self.generation())
+        index = self.tree_cache.get(key)
+        if index is NO_VALUE:
+            index = OrderedDict()
+            for row in self.from_parent_deeper(db_session=db_session):
+                resource = row.Resource
+                index[resource.resource_id] = TreeIndexNode(
+                    resource.resource_id, resource.parent_id, row.depth, resource.resource_name
+                )
+            self.tree_cache.set(key, index)
+        return index
+
+    def cached_path_upper(self, resource_id, db_session=None):
+        """ like `path_upper` - nodes from resource up to the root, served from index """
+        index = self.cached_index(db_session=db_session)
+        path = []
+        node = index.get(resource_id)
+        while node is not None:
+            path.append(node)
+            node = index.get(node.parent_id)
+        return path
+
+    def delete_branch(self, resource_id=None, db_session=None, *args, **kwargs):
+        result = super(CachedResourceTreeService, self).delete_branch(
+            resource_id=resource_id, db_session=db_session, *args, **kwargs
+        )
+        self.invalidate(db_session=db_session)
+        return result
+
+    def move_to_position(self, resource_id, to_position, new_parent_id=noop, db_session=None, *args, **kwargs):
+        result = super(CachedResourceTreeService, self).move_to_position(
+            resource_id=resource_id,
+            to_position=to_position,
+            new_parent_id=new_parent_id,
+            db_session=db_session,
+            *args,
+            **kwargs,
+        )
+        self.invalidate(db_session=db_session)
+        return result
+
+    def set_position(self, resource_id, to_position, db_session=None, *args, **kwargs):
+        result = super(CachedResourceTreeService, self).set_position(
+            resource_id=resource_id, to_position=to_position, db_session=db_session, *args, **kwargs
+        )
+        self.invalidate(db_session=db_session)
+        return result
+
+
+tree_service = CachedResourceTreeService(ResourceTreeServicePostgreSQL)
+
+
+def configure_tree_service(settings):
+    """ switches tree reads to materialized paths if `resource_tree.materialized_path` is enabled """
+    if asbool(settings.get("resource_tree.materialized_path", False)):
+        tree_service.service = ResourceTreeServiceMaterializedPath
+    else:
+        tree_service.service = ResourceTreeServicePostgreSQL
+
+
+@sa.event.listens_for(Resource, "after_insert", propagate=True)
+@sa.event.listens_for(Resource, "after_delete", propagate=True)
+def _resource_added_or_removed(mapper, connection, target):
+    tree_service.invalidate(db_session=sa.orm.object_session(target))
+
+
+@sa.event.listens_for(Resource, "after_update", propagate=True)
+def _resource_updated(mapper, connection, target):
+    # ordering changes go through tree_service, here we catch renames
+    state = sa.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TreeNode._fields):
+        tree_service.invalidate(db_session=sa.orm.object_session(target))
@@ -6,6 +6,10 @@ from ziggurat_foundations.models.base import get_db_session
 from ziggurat_foundations.models.services.user import UserService as UService
 
 from testscaffold.models.db import User
+from testscaffold.services.count import CountService
+from testscaffold.util import escape_like
+from testscaffold.util.pagination import KeysetPage
+from testscaffold.util.sqlalchemy import identity_map_value
 
 log = logging.getLogger(__name__)
 
@@ -20,6 +24,48 @@ class UserService(UService):
         query = db_session.query(cls.model)
         return query.get(user_id)
 
+    @classmethod
+    def version(cls, user_id, db_session=None):
+        """ `updated_date` of user without loading the object, None if it does not exist """
+        if not user_id:
+            return None
+        db_session = get_db_session(db_session)
+        # authenticated user is usually loaded already
+        updated_date = identity_map_value(db_session, cls.model, user_id, "updated_date")
+        if updated_date is not None:
+            return updated_date
+        return db_session.query(cls.model.updated_date).filter(cls.model.id == user_id).scalar()
+
+    @classmethod
+    def get_for_auth(cls, user_id, db_session=None):
+        """
+        Fetches user together with groups in a single query,
+        used by authentication callback that needs both
+        """
+        if not user_id:
+            return None
+        db_session = get_db_session(db_session)
+        query = db_session.query(cls.model).options(sa.orm.joinedload(cls.model.groups))
+        return query.filter(cls.model.id == user_id).one_or_none()
+
+    @classmethod
+    def by_user_names_or_emails(cls, user_names=(), emails=(), db_session=None):
+        """
+        Users matching any of the user names or emails (case insensitive
+        like `by_user_name` and `by_email`), fetched in a single query
+        """
+        user_names = set(name.lower() for name in user_names if name)
+        emails = set(email.lower() for email in emails if email)
+        if not user_names and not emails:
+            return []
+        db_session = get_db_session(db_session)
+        criteria = []
+        if user_names:
+            criteria.append(sa.func.lower(cls.model.user_name).in_(user_names))
+        if emails:
+            criteria.append(sa.func.lower(cls.model.email).in_(emails))
+        return db_session.query(cls.model).filter(sa.or_(*criteria)).all()
+
     @classmethod
     def latest_registered_user(cls, db_session=None):
         db_session = get_db_session(db_session)
@@ -31,22 +77,81 @@ class UserService(UService):
         return db_session.query(User).order_by(sa.desc(User.last_login_date)).first()
 
     @classmethod
-    def total_count(cls, db_session=None):
+    def total_count(cls, db_session=None, count_mode="exact"):
         db_session = get_db_session(db_session)
-        return db_session.query(User).count()
+        item_count, _ = CountService.count(db_session.query(User), mode=count_mode)
+        return item_count
+
+    @classmethod
+    def filter_query(cls, query, filter_params):
+        """
+        Case insensitive user search, supported params:
+        `user_name_like` (prefix), `user_name_contains`, `email_contains`
+        and `search` (user_name or email contains), all served by trigram indexes
+        """
+        user_name_like = filter_params.get("user_name_like")
+        if user_name_like:
+            query = query.filter(User.user_name.ilike(escape_like(user_name_like) + "%", escape="\\"))
+        user_name_contains = filter_params.get("user_name_contains")
+        if user_name_contains:
+            query = query.filter(User.user_name.ilike("%" + escape_like(user_name_contains) + "%", escape="\\"))
+        email_contains = filter_params.get("email_contains")
+        if email_contains:
+            query = query.filter(User.email.ilike("%" + escape_like(email_contains) + "%", escape="\\"))
+        search = filter_params.get("search")
+        if search:
+            pattern = "%" + escape_like(search) + "%"
+            query = query.filter(
+                sa.or_(User.user_name.ilike(pattern, escape="\\"), User.email.ilike(pattern, escape="\\"))
+            )
+        return query
 
     @classmethod
-    def get_paginator(cls, page=1, item_count=None, items_per_page=50, db_session=None, filter_params=None, **kwargs):
-        """ returns paginator over users belonging to the group"""
+    def export_query(cls, filter_params=None, db_session=None):
+        """ filtered users in stable order, same filters as `get_paginator` """
+        db_session = get_db_session(db_session)
+        query = cls.filter_query(db_session.query(User), filter_params or {})
+        return query.order_by(User.id)
+
+    @classmethod
+    def get_paginator(
+        cls,
+        page=1,
+        item_count=None,
+        items_per_page=50,
+        db_session=None,
+        filter_params=None,
+        cursor=None,
+        with_count=False,
+        count_mode="exact",
+        **kwargs,
+    ):
+        """
+        returns paginator over users, passing `cursor` (can be empty string
+        for first page) switches to keyset pagination without OFFSET,
+        `count_mode` selects how total count is computed
+        """
         if filter_params is None:
             filter_params = {}
         db_session = get_db_session(db_session)
-        query = db_session.query(User)
-        user_name_like = filter_params.get("user_name_like")
-        if user_name_like:
-            query = query.filter(User.user_name.like(user_name_like + "%"))
+        query = cls.filter_query(db_session.query(User), filter_params)
         query = query.order_by(User.id)
-        return SqlalchemyOrmPage(query, page=page, item_count=item_count, items_per_page=items_per_page, **kwargs)
+        if cursor is not None:
+            if with_count and item_count is None:
+                item_count, count_mode = CountService.count(query, mode=count_mode)
+            return KeysetPage(
+                query,
+                User.id,
+                cursor=cursor,
+                items_per_page=items_per_page,
+                item_count=item_count,
+                count_mode=count_mode if item_count is not None else None,
+            )
+        if item_count is None:
+            item_count, count_mode = CountService.count(query, mode=count_mode)
+        paginator = SqlalchemyOrmPage(query, page=page, item_count=item_count, items_per_page=items_per_page, **kwargs)
+        paginator.count_mode = count_mode
+        return paginator
 
     @classmethod
     def permission_info(cls, user):
@@ -0,0 +1,34 @@
+// replaces options of parent dropdown with results of paged parent search
+document.addEventListener('DOMContentLoaded', function () {
+    var search = document.getElementById('parent-search');
+    var select = document.getElementById('parent_id');
+    if (!search || !select) {
+        return;
+    }
+    var timeout = null;
+
+    function loadChoices() {
+        var url = search.getAttribute('data-url') + '?q=' + encodeURIComponent(search.value);
+        fetch(url, {credentials: 'same-origin'}).then(function (response) {
+            return response.json();
+        }).then(function (items) {
+            var selected = select.value;
+            // keep root and current selection
+            Array.prototype.slice.call(select.options).forEach(function (option) {
+                if (option.value !== '' && option.value !== selected) {
+                    select.removeChild(option);
+                }
+            });
+            items.forEach(function (item) {
+                if (String(item.id) !== selected) {
+                    select.appendChild(new Option(item.label, item.id));
+                }
+            });
+        });
+    }
+
+    search.addEventListener('input', function () {
+        clearTimeout(timeout);
+        timeout = setTimeout(loadChoices, 250);
+    });
+});
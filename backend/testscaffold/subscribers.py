@@ -2,14 +2,13 @@ import json
 
 from pyramid.events import subscriber, BeforeRender, NewRequest
 from pyramid.i18n import TranslationStringFactory
-from pyramid.renderers import render
 from pyramid.threadlocal import get_current_request
-from pyramid_mailer import get_mailer
-from pyramid_mailer.message import Message
 from testscaffold.services.external_identity import ExternalIdentityService
 
+from testscaffold.celery.tasks import send_emails
 from testscaffold.events import EmailEvent, SocialAuthEvent
 from testscaffold.models.db import ExternalIdentity
+from testscaffold.util.request import track_session_operations
 from testscaffold.validation.forms import UserLoginForm
 
 _ = TranslationStringFactory("testscaffold")
@@ -17,19 +16,30 @@ _ = TranslationStringFactory("testscaffold")
 
 @subscriber(EmailEvent)
 def email_handler(event):
-    mailer = get_mailer(event.request)
-    settings = event.request.registry.settings
-    rendered = render(event.tmpl_loc, event.tmpl_vars, request=event.request)
-    message = Message(
-        subject=event.tmpl_vars["email_title"],
-        sender=settings["mailing.from_email"],
-        recipients=event.recipients,
-        html=rendered,
-    )
-    if not event.send_immediately:
-        mailer.send(message)
-    else:
-        mailer.send_immediately(message, fail_silently=event.fail_silently)
+    """
+    Queues mail for celery worker, mails from one request are sent by single
+    task after transaction commits, `send_immediately` skips the wait
+    """
+    request = event.request
+    email = {
+        "recipients": event.recipients,
+        "tmpl_vars": event.tmpl_vars,
+        "tmpl_loc": event.tmpl_loc,
+        "fail_silently": event.fail_silently,
+    }
+    if event.send_immediately:
+        send_emails.delay([email], request.locale_name)
+        return
+    pending_emails = getattr(request, "pending_emails", None)
+    if pending_emails is None:
+        pending_emails = request.pending_emails = []
+        request.tm.get().addAfterCommitHook(queue_pending_emails, args=(pending_emails, request.locale_name))
+    pending_emails.append(email)
+
+
+def queue_pending_emails(success, emails, locale_name):
+    if success:
+        send_emails.delay(emails, locale_name)
 
 
 @subscriber(SocialAuthEvent)
@@ -71,12 +81,16 @@ def handle_social_data(event):
 @subscriber(BeforeRender)
 def add_globals(event):
     request = event.get("request") or get_current_request()
-    flash_messages = request.session.pop_flash()
+    # stateless requests never flash, don't load session just to find that out,
+    # pages rendered for response cache must not depend on session either
+    sessionless = request.stateless or request.response_cache_route
+    flash_messages = [] if sessionless else request.session.pop_flash()
     event["flash_messages"] = flash_messages
     event["base_url"] = request.registry.settings["base_url"]
     request.response.headers[str("x-flash-messages")] = json.dumps(flash_messages)
     # we only need to instantiate the form if user is unlogged
-    if hasattr(request, "user") and not request.user:
+    # form carries session CSRF token, cached pages link to login page instead
+    if not sessionless and hasattr(request, "user") and not request.user:
         event["layout_login_form"] = UserLoginForm(request.POST, context={"request": request})
     else:
         event["layout_login_form"] = None
@@ -85,11 +99,21 @@ def add_globals(event):
 @subscriber(NewRequest)
 def new_request(event):
     environ = event.request.environ
+    track_session_operations(event.request)
     event.request.response.headers[str("X-Frame-Options")] = str("SAMEORIGIN")
     event.request.response.headers[str("X-XSS-Protection")] = str("1; mode=block")
-    if environ["wsgi.url_scheme"] == "https":
-        event.request.response.set_cookie("XSRF-TOKEN", event.request.session.get_csrf_token(), secure=True)
-    else:
-        event.request.response.set_cookie("XSRF-TOKEN", event.request.session.get_csrf_token())
-    if event.request.user:
-        event.request.response.headers[str("x-uid")] = str(event.request.user.id)
+    # API clients send token or use auth_tkt, they have no use for XSRF cookie
+    if not event.request.stateless and not event.request.response_cache_route:
+        if environ["wsgi.url_scheme"] == "https":
+            event.request.response.set_cookie("XSRF-TOKEN", event.request.session.get_csrf_token(), secure=True)
+        else:
+            event.request.response.set_cookie("XSRF-TOKEN", event.request.session.get_csrf_token())
+    # don't resolve user here, static files and public pages shouldn't pay for authentication
+    event.request.add_response_callback(add_uid_header)
+
+
+def add_uid_header(request, response):
+    """ sets x-uid only if something already resolved `request.user` during request """
+    user = request.__dict__.get("user")
+    if user:
+        response.headers[str("x-uid")] = str(user.id)
@@ -40,6 +40,9 @@ def minimal_setup(app_settings):
     config.include("testscaffold.models")
     # make request.user available
     config.add_request_method("testscaffold.util.request:get_user", "user", reify=True)
+    config.add_request_method(
+        "testscaffold.util.request:get_effective_permissions", "effective_permissions", reify=True
+    )
     config.add_request_method("testscaffold.util.request:safe_json_body", "safe_json_body", reify=True)
     config.add_request_method("testscaffold.util.request:unsafe_json_body", "unsafe_json_body", reify=True)
     config.add_request_method("testscaffold.util.request:get_authomatic", "authomatic", reify=True)
@@ -96,6 +99,7 @@ def with_migrations(app_settings):
 def _clean_tables(session):
 
     from testscaffold.models.meta import Base
+    from testscaffold.services.resource_tree_service import tree_service
 
     tables = Base.metadata.tables.keys()
     for t in tables:
@@ -105,6 +109,8 @@ def _clean_tables(session):
         ]:
             session.execute("truncate %s cascade" % t)
     session.commit()
+    # raw truncate bypasses ORM events that keep cached trees fresh
+    tree_service.invalidate()
 
 
 @pytest.fixture()
@@ -2,7 +2,7 @@ import pprint
 
 import pytest
 
-from testscaffold.tests.utils import create_entry, session_context, create_admin
+from testscaffold.tests.utils import create_entry, session_context, create_admin, create_user, count_queries
 
 
 def create_default_tree(db_session):
@@ -89,6 +89,145 @@ class TestFunctionalAPIEntries:
         assert response.headers["x-pages"] == "2"
         assert response.headers["x-current-page"] == "1"
         assert response.headers["x-total-count"] == "100"
+        assert response.headers["x-total-count-mode"] == "exact"
+
+    def test_entries_list_second_page(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            for x in range(1, 61):
+                create_entry({"resource_name": "entry-{}".format(x)}, sqla_session=session)
+
+        url_path = "/api/0.1/entries?page=2"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        assert len(response.json) == 10
+        assert response.headers["x-current-page"] == "2"
+
+    def test_entries_filtering(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_default_tree(db_session=session)
+            create_entry({"resource_name": "note_entry", "note": "100% done"}, sqla_session=session)
+
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get("/api/0.1/entries?resource_name_like=ac", status=200, headers=headers)
+        assert sorted(item["resource_name"] for item in response.json) == ["ac", "aca", "aca"]
+        response = full_app.get("/api/0.1/entries?parent_id=1", status=200, headers=headers)
+        assert [item["resource_name"] for item in response.json] == ["aa", "ab", "ac", "ad"]
+        response = full_app.get("/api/0.1/entries?note=0%25", status=200, headers=headers)
+        assert [item["resource_name"] for item in response.json] == ["note_entry"]
+        full_app.get("/api/0.1/entries?parent_id=foo", status=400, headers=headers)
+
+    def test_entries_list_conditional(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_default_tree(db_session=session)
+
+        url_path = "/api/0.1/entries?parent_id=1"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        # plain listing does not pay for collection version
+        with count_queries() as statements:
+            response = full_app.get(url_path, status=200, headers=headers)
+        assert "etag" not in response.headers
+        assert not [statement for statement in statements if "max(" in statement.lower()]
+
+        response = full_app.get(url_path, status=200, headers=dict(headers, **{"If-None-Match": '"unknown"'}))
+        conditional_headers = dict(headers, **{"If-None-Match": response.headers["etag"]})
+        full_app.get(url_path, status=304, headers=conditional_headers)
+        # different page or filters have own validators
+        full_app.get(url_path + "&page=2", status=200, headers=conditional_headers)
+
+        full_app.patch_json("/api/0.1/entries/6", {"note": "changed"}, status=200, headers=headers)
+        response = full_app.get(url_path, status=200, headers=conditional_headers)
+        full_app.delete("/api/0.1/entries/8", status=200, headers=headers)
+        full_app.get(url_path, status=200, headers=dict(headers, **{"If-None-Match": response.headers["etag"]}))
+
+    def test_entries_export(self, full_app, sqla_session):
+        import json
+
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_default_tree(db_session=session)
+
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get("/api/0.1/entries/export?parent_id=1", status=200, headers=headers)
+        assert response.content_type == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["resource_name"] for row in rows] == ["aa", "ab", "ac", "ad"]
+        response = full_app.get("/api/0.1/entries/export?format=csv&resource_name_like=ac", status=200, headers=headers)
+        assert response.content_type == "text/csv"
+        assert 'filename="entries.csv"' in response.headers["content-disposition"]
+        lines = response.text.splitlines()
+        assert lines[0].startswith("resource_id,")
+        assert len(lines) == 4
+        full_app.get("/api/0.1/entries/export?format=xml", status=400, headers=headers)
+        full_app.get("/api/0.1/entries/export", status=403)
+
+    def test_entries_search(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            user = create_user({"user_name": "testX", "email": "testX@test.local"}, sqla_session=session)
+            user_token = user.auth_tokens[0].token
+            create_entry(
+                {"resource_name": "notes", "note": "about gardening", "owner_user_id": user.id}, sqla_session=session,
+            )
+            create_entry(
+                {"resource_name": "gardening", "note": "plants", "owner_user_id": user.id}, sqla_session=session,
+            )
+            create_entry({"resource_name": "admin gardening", "owner_user_id": admin.id}, sqla_session=session)
+
+        url_path = "/api/0.1/entries/search?q=gardens"
+        headers = {str("x-testscaffold-auth-token"): str(user_token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        # name matches rank above note matches, other users entries are hidden
+        assert [item["resource_name"] for item in response.json] == ["gardening", "notes"]
+        assert response.json[0]["rank"] > response.json[1]["rank"]
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        assert len(response.json) == 3
+        full_app.get(url_path, status=403)
+        full_app.get("/api/0.1/entries/search?q=", status=400, headers=headers)
+
+    def test_entries_list_cursor(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            for x in range(1, 51):
+                create_entry(
+                    {"resource_name": "entry-x{}".format(x), "note": "x{}".format(x)}, sqla_session=session,
+                )
+                create_entry(
+                    {"resource_name": "entry-y{}".format(x), "note": "y{}".format(x)}, sqla_session=session,
+                )
+
+        url_path = "/api/0.1/entries?cursor="
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        items = response.json
+        assert len(items) == 50
+        assert items[0]["resource_name"] == "entry-x1"
+        assert "x-total-count" not in response.headers
+        links = dict(link.split(", ") for link in response.headers["link"].split("; "))
+        assert 'rel="prev"' not in links
+
+        response = full_app.get(links['rel="next"'].strip("<>"), status=200, headers=headers)
+        items = response.json
+        assert len(items) == 50
+        assert items[0]["resource_name"] == "entry-x26"
+        assert items[49]["resource_name"] == "entry-y50"
+        links = dict(link.split(", ") for link in response.headers["link"].split("; "))
+        assert 'rel="next"' not in links
+
+        response = full_app.get(links['rel="prev"'].strip("<>") + "&count=1", status=200, headers=headers)
+        assert response.json[0]["resource_name"] == "entry-x1"
+        assert response.headers["x-total-count"] == "100"
+
+    def test_entries_list_bad_cursor(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+
+        url_path = "/api/0.1/entries?cursor=foo"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        full_app.get(url_path, status=400, headers=headers)
 
     def test_entry_create_no_json(self, full_app, sqla_session):
         with session_context(sqla_session) as session:
@@ -135,6 +274,141 @@ class TestFunctionalAPIEntries:
         assert entry_dict["resource_name"] == response.json["resource_name"]
         assert entry_dict["note"] == response.json["note"]
 
+    def test_entries_bulk(self, full_app, sqla_session):
+        from testscaffold.services.resource_tree_service import tree_service
+
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            parent = create_entry({"resource_name": "x", "ordering": 1}, sqla_session=session)
+            moved = create_entry({"resource_name": "y", "ordering": 2}, sqla_session=session)
+            parent_id, moved_id = parent.resource_id, moved.resource_id
+
+        url_path = "/api/0.1/entries/bulk"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        operations = [
+            {"op": "create", "resource_name": "n1", "parent_id": parent_id, "note": "first"},
+            {"op": "create", "resource_name": "n2", "parent_id": parent_id, "ordering": 1},
+            {"op": "move", "resource_id": moved_id, "parent_id": parent_id, "ordering": 2},
+            {"op": "patch", "resource_id": parent_id, "resource_name": "x2"},
+        ]
+        response = full_app.post_json(url_path, operations, status=200, headers=headers)
+        assert [(item["index"], item["status"]) for item in response.json] == [(i, "ok") for i in range(4)]
+        created_ids = [item["resource_id"] for item in response.json[:2]]
+        assert [item["ordering"] for item in response.json] == [3, 1, 2, 1]
+
+        result = tree_service.from_parent_deeper(None, db_session=sqla_session)
+        tree_struct = tree_service.build_subtree_strut(result)["children"]
+        assert list(tree_struct.keys()) == [parent_id]
+        assert tree_struct[parent_id]["node"].resource_name == "x2"
+        children = tree_struct[parent_id]["children"]
+        assert list(children.keys()) == [created_ids[1], moved_id, created_ids[0]]
+        assert [child["node"].ordering for child in children.values()] == [1, 2, 3]
+        assert children[created_ids[0]]["node"].owner_user_id == admin.id
+
+    def test_entries_bulk_patch_only(self, full_app, sqla_session):
+        from testscaffold.models.db import Entry
+
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            parent = create_entry({"resource_name": "x", "ordering": 1}, sqla_session=session)
+            child = create_entry(
+                {"resource_name": "y", "ordering": 1, "parent_id": parent.resource_id}, sqla_session=session
+            )
+            parent_id, child_id = parent.resource_id, child.resource_id
+
+        url_path = "/api/0.1/entries/bulk"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        operations = [{"op": "patch", "resource_id": child_id, "resource_name": "y2", "note": "patched"}]
+        response = full_app.post_json(url_path, operations, status=200, headers=headers)
+        assert response.json[0]["status"] == "ok"
+        assert response.json[0]["parent_id"] == parent_id
+        assert response.json[0]["ordering"] == 1
+        entry = sqla_session.query(Entry).filter(Entry.resource_id == child_id).one()
+        assert (entry.resource_name, entry.note, entry.ordering) == ("y2", "patched", 1)
+
+    def test_entries_bulk_errors_roll_back(self, full_app, sqla_session):
+        from testscaffold.models.db import Entry
+
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            parent = create_entry({"resource_name": "x", "ordering": 1}, sqla_session=session)
+            child = create_entry(
+                {"resource_name": "y", "ordering": 1, "parent_id": parent.resource_id}, sqla_session=session
+            )
+            parent_id, child_id = parent.resource_id, child.resource_id
+
+        url_path = "/api/0.1/entries/bulk"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        operations = [
+            {"op": "create", "resource_name": "n1"},
+            {"op": "move", "resource_id": parent_id, "parent_id": child_id},
+            {"op": "move", "resource_id": child_id, "ordering": 5},
+            {"op": "patch"},
+        ]
+        response = full_app.post_json(url_path, operations, status=422, headers=headers)
+        assert list(response.json.keys()) == ["3"]
+        response = full_app.post_json(url_path, operations[:3], status=422, headers=headers)
+        assert response.json["1"]["parent_id"] == ["Trying to insert node into itself"]
+        assert response.json["2"]["ordering"] == ["Position is out of bounds"]
+        assert sqla_session.query(Entry).count() == 2
+
+    def test_index_menu_follows_tree_changes(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_entry({"resource_name": "first-menu-entry", "ordering": 1}, sqla_session=session)
+
+        response = full_app.get("/", status=200)
+        assert "first-menu-entry" in response.text
+        # served from cache now, changes through API have to show up
+        url_path = "/api/0.1/entries"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        entry_dict = {"resource_name": "second-menu-entry", "ordering": 1}
+        full_app.post_json(url_path, entry_dict, status=200, headers=headers)
+        response = full_app.get("/", status=200)
+        assert "second-menu-entry" in response.text
+        assert response.text.index("second-menu-entry") < response.text.index("first-menu-entry")
+
+    def test_parent_choices(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_default_tree(db_session=session)
+
+        url_path = "/admin/entries/verb/parent_choices?q=AC"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        assert [item["id"] for item in response.json] == [7, 9, 12]
+        assert response.json[0]["label"] == "------ ac"
+        assert response.headers["x-total-count"] == "3"
+        assert response.headers["x-tree-version"]
+
+    def test_materialized_path_matches_recursive_tree(self, full_app, sqla_session):
+        from ziggurat_foundations.exc import ZigguratResourceTreePathException
+        from ziggurat_foundations.models.services.resource_tree_postgres import ResourceTreeServicePostgreSQL
+        from testscaffold.services.resource_tree_service import ResourceTreeServiceMaterializedPath
+
+        def subtree(service, parent_id, depth):
+            rows = service.from_parent_deeper(parent_id, limit_depth=depth, db_session=session)
+            return [(row.Resource.resource_id, row.depth, row.path) for row in rows]
+
+        def path_ids(service, resource_id):
+            return [node.resource_id for node in service.path_upper(resource_id, db_session=session)]
+
+        with session_context(sqla_session) as session:
+            create_default_tree(db_session=session)
+            for parent_id, depth in [(None, 1000000), (None, 2), (1, 1000000), (7, 1)]:
+                recursive = subtree(ResourceTreeServicePostgreSQL, parent_id, depth)
+                assert recursive == subtree(ResourceTreeServiceMaterializedPath, parent_id, depth)
+            assert path_ids(ResourceTreeServiceMaterializedPath, 12) == path_ids(ResourceTreeServicePostgreSQL, 12)
+
+            # triggers rewrite paths of the whole moved branch
+            ResourceTreeServiceMaterializedPath.move_to_position(
+                resource_id=7, to_position=1, new_parent_id=2, db_session=session
+            )
+            session.expire_all()
+            assert path_ids(ResourceTreeServiceMaterializedPath, 12) == [12, 9, 7, 2, -1]
+            with pytest.raises(ZigguratResourceTreePathException):
+                ResourceTreeServiceMaterializedPath.check_node_parent(7, 12, db_session=session)
+
     def test_entry_patch(self, full_app, sqla_session):
         with session_context(sqla_session) as session:
             admin, token = create_admin(session)
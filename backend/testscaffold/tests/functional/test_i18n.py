@@ -8,6 +8,7 @@ class TestI18N:
         response = full_app.get(url_path, {}, status=200)
         assert "Some project name" in response.text
         assert "Register here" in response.text
+        response = full_app.get("/register", {}, status=200)
         assert "Password" in response.text
 
     def test_pl_translation(self, full_app):
@@ -15,4 +16,75 @@ class TestI18N:
         response = full_app.get(url_path, {}, status=200)
         assert "Nazwa projektu" in response.text
         assert "Rejestruj się" in response.text
+        response = full_app.get("/register?_LOCALE_=pl", {}, status=200)
         assert "Hasło" in response.text
+
+
+@pytest.fixture()
+def cached_app(app_settings):
+    from webtest import TestApp
+    from testscaffold import main
+
+    settings = dict(app_settings, **{"response_cache.enabled": "true", "response_cache.routes": "/"})
+    return TestApp(main({}, **settings))
+
+
+@pytest.mark.usefixtures("with_migrations", "clean_tables", "sqla_session")
+class TestResponseCache:
+    def test_anonymous_index_cached_per_locale(self, cached_app):
+        from testscaffold.services.resource_tree_service import tree_service
+
+        # start from fresh generation so earlier tests don't leave cached pages
+        tree_service.generation_cache.delete("current")
+        response = cached_app.get("/", status=200)
+        assert response.headers["X-Cache"] == "MISS"
+        assert "Set-Cookie" not in response.headers
+        response = cached_app.get("/", status=200)
+        assert response.headers["X-Cache"] == "HIT"
+        assert "Register here" in response.text
+        # session CSRF token and login form never end up in shared page
+        assert "csrf_token" not in response.text
+        assert 'name="password"' not in response.text
+
+        response = cached_app.get("/", headers={"Cookie": "_LOCALE_=pl"}, status=200)
+        assert response.headers["X-Cache"] == "MISS"
+        response = cached_app.get("/", headers={"Cookie": "_LOCALE_=pl"}, status=200)
+        assert response.headers["X-Cache"] == "HIT"
+        assert "Rejestruj się" in response.text
+
+        tree_service.generation_cache.delete("current")
+        response = cached_app.get("/", status=200)
+        assert response.headers["X-Cache"] == "MISS"
+
+    def test_session_cookie_bypasses_cache(self, cached_app):
+        response = cached_app.get("/", headers={"Cookie": "testscaffold_session=xxx"}, status=200)
+        assert "X-Cache" not in response.headers
+
+    def test_cookie_setting_response_not_stored(self, cached_app):
+        from testscaffold.services.resource_tree_service import tree_service
+        from testscaffold.views.index import IndexViews
+
+        tree_service.generation_cache.delete("current")
+        original = IndexViews.index
+
+        def index(self):
+            self.request.response.set_cookie("flag", "x")
+            return original(self)
+
+        IndexViews.index = index
+        try:
+            response = cached_app.get("/", status=200)
+        finally:
+            IndexViews.index = original
+        assert "X-Cache" not in response.headers
+        assert "flag=x" in response.headers["Set-Cookie"]
+        response = cached_app.get("/", status=200)
+        assert response.headers["X-Cache"] == "MISS"
+
+    def test_route_without_content_sources_rejected(self, app_settings):
+        from pyramid.exceptions import ConfigurationError
+        from testscaffold import main
+
+        settings = dict(app_settings, **{"response_cache.enabled": "true", "response_cache.routes": "/ register"})
+        with pytest.raises(ConfigurationError):
+            main({}, **settings)
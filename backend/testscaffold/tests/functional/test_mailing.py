@@ -0,0 +1,65 @@
+import pytest
+
+from testscaffold.tests.utils import create_user, session_context
+
+
+@pytest.fixture()
+def eager_mail_app(app_settings):
+    from webtest import TestApp
+    from testscaffold import main
+
+    settings = dict(app_settings, **{"celery.always_eager": "true", "mailing.backend": "local"})
+    return TestApp(main({}, **settings))
+
+
+def get_outbox(app):
+    from pyramid_mailer.interfaces import IMailer
+
+    return app.app.registry.getUtility(IMailer).outbox
+
+
+@pytest.mark.usefixtures("with_migrations", "clean_tables", "sqla_session")
+class TestMailing:
+    def test_lost_password_mail_sent_after_commit(self, eager_mail_app, sqla_session):
+        from testscaffold.models.db import User
+
+        with session_context(sqla_session) as session:
+            create_user({"user_name": "lost", "email": "lost@example.com"}, sqla_session=session)
+
+        response = eager_mail_app.get("/lost_password", status=200)
+        form = next(form for form in response.forms.values() if form.action.endswith("/lost_password"))
+        form["email"] = "lost@example.com"
+        form.submit(status=302)
+
+        outbox = get_outbox(eager_mail_app)
+        assert len(outbox) == 1
+        assert outbox[0].recipients == ["lost@example.com"]
+        user = sqla_session.query(User).filter(User.user_name == "lost").one()
+        base_url = eager_mail_app.app.registry.settings["base_url"]
+        assert base_url + "/lost_password_generate?" in outbox[0].html
+        assert "security_code=" + user.security_code in outbox[0].html
+
+    def test_mail_not_queued_on_abort(self, eager_mail_app):
+        from pyramid.scripting import prepare
+        from testscaffold.events import EmailEvent
+
+        registry = eager_mail_app.app.registry
+        for finish in ("abort", "commit"):
+            env = prepare(registry=registry)
+            request = env["request"]
+            try:
+                request.tm.begin()
+                event = EmailEvent(
+                    request,
+                    recipients=["user@example.com"],
+                    tmpl_vars={"user": {"user_name": "user", "security_code": "x"}, "email_title": "title"},
+                    tmpl_loc="testscaffold:templates/emails/lost_password.jinja2",
+                )
+                registry.notify(event)
+                getattr(request.tm, finish)()
+            finally:
+                env["closer"]()
+            if finish == "abort":
+                assert get_outbox(eager_mail_app) == []
+        # same mail is delivered once transaction commits
+        assert len(get_outbox(eager_mail_app)) == 1
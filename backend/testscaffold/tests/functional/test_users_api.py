@@ -1,7 +1,18 @@
+import logging
+
 import pytest
 from six.moves.urllib import parse
 
-from testscaffold.tests.utils import create_user, session_context, create_admin
+from testscaffold.tests.utils import create_user, session_context, create_admin, count_queries
+
+
+@pytest.fixture()
+def stateless_app(app_settings):
+    from webtest import TestApp
+    from testscaffold import main
+
+    settings = dict(app_settings, **{"stateless_api.enabled": "true"})
+    return TestApp(main({}, **settings))
 
 
 @pytest.mark.usefixtures("full_app", "with_migrations", "clean_tables", "sqla_session")
@@ -24,6 +35,32 @@ class TestFunctionalAPIUsers:
         items = response.json
         assert len(items) == 2
 
+    def test_users_list_stateless(self, stateless_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            admin_id = admin.id
+
+        url_path = "/api/0.1/users"
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = stateless_app.get(url_path, status=200, headers=headers)
+        # user was resolved for permission check so x-uid is set
+        assert response.headers["x-uid"] == str(admin_id)
+        # no beaker session or XSRF cookie for token authenticated calls
+        assert "Set-Cookie" not in response.headers
+        assert response.headers["x-flash-messages"] == "[]"
+
+    def test_users_list_session_operations(self, stateless_app, sqla_session, caplog):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+
+        caplog.set_level(logging.DEBUG, logger="testscaffold.util.request")
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        stateless_app.get("/api/0.1/users", status=200, headers=headers)
+        records = [record for record in caplog.records if record.getMessage() == "session_operations"]
+        assert len(records) == 1
+        assert (records[0].stateless, records[0].load, records[0].save) == (True, 0, 0)
+        assert records[0].saved >= 1
+
     def test_users_filtering(self, full_app, sqla_session):
         with session_context(sqla_session) as session:
             admin, token = create_admin(session)
@@ -41,6 +78,100 @@ class TestFunctionalAPIUsers:
         items = response.json
         assert items[0]["user_name"] == "barbaz"
 
+    def test_users_search_case_insensitive(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_user({"user_name": "FooBar", "email": "first@example.com"}, sqla_session=session)
+            create_user({"user_name": "other", "email": "SECOND_foo@example.com"}, sqla_session=session)
+
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get("/api/0.1/users?user_name_like=foo", status=200, headers=headers)
+        assert [item["user_name"] for item in response.json] == ["FooBar"]
+        response = full_app.get("/api/0.1/users?user_name_contains=BAR", status=200, headers=headers)
+        assert [item["user_name"] for item in response.json] == ["FooBar"]
+        response = full_app.get("/api/0.1/users?email_contains=d_FOO", status=200, headers=headers)
+        assert [item["user_name"] for item in response.json] == ["other"]
+        response = full_app.get("/api/0.1/users?search=foo", status=200, headers=headers)
+        assert sorted(item["user_name"] for item in response.json) == ["FooBar", "other"]
+
+    def test_users_export(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            create_user({"user_name": "FooBar", "email": "first@example.com"}, sqla_session=session)
+            create_user({"user_name": "other", "email": "second@example.com"}, sqla_session=session)
+
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get("/api/0.1/users/export?format=csv&search=FOO", status=200, headers=headers)
+        lines = response.text.splitlines()
+        assert lines[0].split(",") == ["id", "user_name", "email", "status", "last_login_date", "registered_date"]
+        assert [line.split(",")[1] for line in lines[1:]] == ["FooBar"]
+        response = full_app.get("/api/0.1/users/export", status=200, headers=headers)
+        assert len(response.text.splitlines()) == 3
+        assert "password" not in response.text
+
+    def test_users_list_pretty(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get("/api/0.1/users", status=200, headers=headers)
+        assert response.content_type == "application/json"
+        assert "\n" not in response.text
+        pretty = full_app.get("/api/0.1/users?pretty=1", status=200, headers=headers)
+        assert "\n  " in pretty.text
+        assert pretty.json == response.json
+
+    def test_user_get_query_count(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+
+        url_path = "/api/0.1/users/{}".format(admin.id)
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        # token lookup, user with groups, permissions snapshot
+        with count_queries() as statements:
+            full_app.get(url_path, status=200, headers=headers)
+        assert len(statements) == 3
+        # token and permissions are cached now, only user is loaded
+        with count_queries() as statements:
+            full_app.get(url_path, status=200, headers=headers)
+        assert len(statements) == 1
+
+    def test_auth_token_delete_rejected_immediately(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            admin_id, token_id = admin.id, admin.auth_tokens[0].id
+
+        url_path = "/api/0.1/users/{}".format(admin_id)
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        # token owner is cached now
+        full_app.get(url_path, status=200, headers=headers)
+        delete_path = "/user_self/{}/auth_tokens/verb/DELETE".format(admin_id)
+        full_app.post(delete_path, {"token_id": token_id + 1}, status=404, headers=headers)
+        response = full_app.post(delete_path, {"token_id": token_id}, status=200, headers=headers)
+        assert response.json == {"id": token_id}
+        full_app.get(url_path, status=403, headers=headers)
+
+    def test_user_get_conditional(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            user = create_user({"user_name": "other", "email": "other@example.com"}, sqla_session=session)
+
+        url_path = "/api/0.1/users/{}".format(user.id)
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        response = full_app.get(url_path, status=200, headers=headers)
+        etag = response.headers["etag"]
+        assert response.headers["last-modified"]
+        conditional_headers = dict(headers, **{"If-None-Match": etag})
+        response = full_app.get(url_path, status=304, headers=conditional_headers)
+        assert response.body == b""
+        modified_headers = dict(headers, **{"If-Modified-Since": response.headers["last-modified"]})
+        full_app.get(url_path, status=304, headers=modified_headers)
+
+        full_app.patch_json(url_path, {"email": "changed@example.com"}, status=200, headers=headers)
+        response = full_app.get(url_path, status=200, headers=conditional_headers)
+        assert response.headers["etag"] != etag
+        full_app.get("/api/0.1/users/-5", status=404, headers=conditional_headers)
+
     def test_user_create_no_json(self, full_app, sqla_session):
         with session_context(sqla_session) as session:
             admin, token = create_admin(session)
@@ -120,6 +251,23 @@ class TestFunctionalAPIUsers:
         headers = {str("x-testscaffold-auth-token"): str(token)}
         full_app.delete_json(url_path, status=200, headers=headers)
 
+    def test_user_delete_evicts_cached_token(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            user = create_user(
+                {"user_name": "testX", "email": "testX@test.local"},
+                permissions=["root_administration"],
+                sqla_session=session,
+            )
+            user_token = user.auth_tokens[0].token
+        url_path = "/api/0.1/users"
+        user_headers = {str("x-testscaffold-auth-token"): str(user_token)}
+        # first call caches token owner
+        full_app.get(url_path, status=200, headers=user_headers)
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        full_app.delete_json("/api/0.1/users/{}".format(user.id), status=200, headers=headers)
+        full_app.get(url_path, status=403, headers=user_headers)
+
 
 @pytest.mark.usefixtures("full_app", "with_migrations", "clean_tables", "sqla_session")
 class TestFunctionalAPIUsersPermissions:
@@ -150,6 +298,20 @@ class TestFunctionalAPIUsersPermissions:
         permission = {"perm_name": "c"}
         full_app.delete(url_path, permission, status=404, headers=headers)
 
+    def test_permission_add_invalidates_snapshot(self, full_app, sqla_session):
+        with session_context(sqla_session) as session:
+            admin, token = create_admin(session)
+            user = create_user({"user_name": "testX", "email": "testX@test.local"}, sqla_session=session,)
+            user_token = user.auth_tokens[0].token
+
+        user_headers = {str("x-testscaffold-auth-token"): str(user_token)}
+        full_app.get("/api/0.1/users", status=403, headers=user_headers)
+        url_path = "/api/0.1/users/{}/permissions".format(user.id)
+        headers = {str("x-testscaffold-auth-token"): str(token)}
+        permission = {"perm_name": "root_administration"}
+        full_app.post_json(url_path, permission, status=200, headers=headers)
+        full_app.get("/api/0.1/users", status=200, headers=user_headers)
+
     def test_permission_delete(self, full_app, sqla_session):
         from ziggurat_foundations.models.services.user import UserService
 
@@ -47,6 +47,31 @@ class TestUsersAPI:
             assert result_dict["email"] == "foo@bar.baz"
             assert "password" not in result_dict
 
+    def test_bulk_uniqueness_single_query(self, sqla_session):
+        from testscaffold.models.db import User
+        from testscaffold.tests.utils import count_queries
+        from testscaffold.validation.schemes import UserCreateSchema
+        import marshmallow
+
+        with tmp_session_context(sqla_session) as session:
+            User(user_name="existing", email="existing@bar.baz").persist(flush=True, db_session=session)
+            request = dummy_request(session)
+            rows = [
+                {"user_name": "user_{}".format(x), "email": "user_{}@bar.baz".format(x), "password": "dupa"}
+                for x in range(20)
+            ]
+            rows.append({"user_name": "EXISTING", "email": "user_1@bar.baz", "password": "dupa"})
+            rows.append({"user_name": "USER_2", "email": "new@bar.baz", "password": "dupa"})
+            schema = UserCreateSchema(context={"request": request}, many=True)
+            with count_queries() as statements:
+                with pytest.raises(marshmallow.ValidationError) as exc:
+                    schema.load(rows)
+            assert len(statements) == 1
+            assert exc.value.messages == {
+                20: {"user_name": ["User already exists in database"], "email": ["Duplicate email in request"]},
+                21: {"user_name": ["Duplicate user name in request"]},
+            }
+
     def test_get_not_found(self, sqla_session):
         from testscaffold.views.api.users import UserAPIView
         import pyramid.httpexceptions
@@ -94,3 +119,232 @@ class TestUsersAPI:
             result = UserAPIView(request).patch()
             assert result["user_name"] == "changed"
             assert result["email"] == "bar@foo.com"
+
+
+@pytest.mark.usefixtures("with_migrations", "clean_tables_once", "minimal_setup")
+class TestCountService:
+    def test_count_modes(self, sqla_session):
+        from testscaffold.models.db import User
+        from testscaffold.services.count import CountService
+
+        with tmp_session_context(sqla_session) as session:
+            for x in range(1, 11):
+                User(email="foo{}".format(x), user_name="bar{}".format(x)).persist(flush=True, db_session=session)
+            query = session.query(User)
+            assert CountService.count(query, mode="exact") == (10, "exact")
+            filtered = query.filter(User.user_name == "bar1")
+            item_count, mode = CountService.count(filtered, mode="estimate")
+            assert mode == "estimate"
+            assert item_count >= 0
+
+
+class TestDumpers:
+    def test_compiled_dumper_matches_schema(self):
+        import datetime
+        from testscaffold.models.db import Entry, Group, User
+        from testscaffold.validation.dumpers import dump, get_dumper
+        from testscaffold.validation.schemes import EntryCreateSchema, GroupEditSchema, UserCreateSchema
+
+        request = testing.DummyRequest()
+        entry = Entry(resource_id=1, resource_name="x", resource_type="entry", ordering=2)
+        user = User(id=3, user_name="u", email="e@x", registered_date=datetime.datetime(2020, 1, 1))
+        group = Group(id=4, group_name="g", description="d")
+        for schema_cls, obj in [(EntryCreateSchema, entry), (UserCreateSchema, user), (GroupEditSchema, group)]:
+            expected = schema_cls(context={}).dump(obj)
+            assert get_dumper(schema_cls)(obj) == expected
+            assert dump(request, schema_cls, [obj], many=True) == [expected]
+        assert request.schema_timings["dump"] > 0
+
+
+class TestMail:
+    def test_pooled_smtp_reuses_connection(self):
+        from pyramid_mailer.mailer import DummyMailer
+        from pyramid_mailer.message import Message
+        from testscaffold.util.mail import mailer_from_settings
+
+        assert isinstance(mailer_from_settings({"mailing.backend": "local"}), DummyMailer)
+        mailer = mailer_from_settings({"mailing.smtp_max_messages": "2"})
+        smtp = mock.Mock()
+        smtp.return_value.ehlo.return_value = (250, b"ok")
+        smtp.return_value.has_extn.return_value = False
+        mailer.smtp_mailer.smtp_mailer.smtp = smtp
+        for x in range(5):
+            message = Message(subject="s", sender="a@test.local", recipients=["b@test.local"], html="<p>x</p>")
+            mailer.send_immediately(message)
+        # 5 messages, new connection after every 2
+        assert smtp.call_count == 3
+        assert smtp.return_value.sendmail.call_count == 5
+
+        # handshake fails the same way plain SMTPMailer does
+        mailer.smtp_mailer.close()
+        mailer.smtp_mailer.smtp_mailer.force_tls = True
+        with pytest.raises(RuntimeError, match="TLS is not available"):
+            mailer.send_immediately(message)
+
+
+class TestCelerySerializers:
+    def test_msgpack_ext_round_trip(self):
+        import datetime
+        import decimal
+        from kombu.serialization import dumps, loads
+        import testscaffold.celery  # noqa registers serializers
+
+        offset = datetime.timezone(datetime.timedelta(hours=2))
+        payload = {
+            "naive": datetime.datetime(2020, 1, 2, 3, 4, 5, 123456),
+            "aware": datetime.datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=offset),
+            "date": datetime.date(2020, 5, 6),
+            "delta": datetime.timedelta(days=-1, seconds=5, microseconds=7),
+            "decimal": decimal.Decimal("1.100"),
+            "nested": [{1: "int key"}],
+        }
+        content_type, encoding, data = dumps(payload, serializer="msgpack_ext")
+        result = loads(data, content_type, encoding)
+        assert result == payload
+        assert result["aware"].utcoffset() == datetime.timedelta(hours=2)
+        assert str(result["decimal"]) == "1.100"
+
+    def test_msgpack_ext_needs_msgpack(self):
+        import testscaffold.celery
+
+        settings = {"celery.broker_url": "memory://", "celery.serializer": "msgpack_ext"}
+        with mock.patch.object(testscaffold.celery, "msgpack", None):
+            with pytest.raises(ValueError, match="requires msgpack"):
+                testscaffold.celery.configure_celery(settings)
+
+
+class TestPyramidSelectorPolicy:
+    def test_selector_runs_once_per_request(self):
+        from pyramid.authentication import RemoteUserAuthenticationPolicy
+        from pyramid.authorization import ACLAuthorizationPolicy
+        from pyramid.security import Allow, Authenticated
+        from testscaffold.security import PyramidSelectorPolicy
+
+        remote_user = RemoteUserAuthenticationPolicy()
+        other_user = RemoteUserAuthenticationPolicy(environ_key="OTHER_USER")
+        calls = []
+
+        def policy_selector(request):
+            calls.append(request)
+            return "remote_user"
+
+        auth_policy = PyramidSelectorPolicy(
+            policy_selector=policy_selector, policies={"remote_user": remote_user, "other_user": other_user}
+        )
+        config = testing.setUp()
+        config.set_authorization_policy(ACLAuthorizationPolicy())
+        config.set_authentication_policy(auth_policy)
+        try:
+            request = testing.DummyRequest(environ={"REMOTE_USER": "foo", "OTHER_USER": "bar"})
+            request.context = testing.DummyResource(__acl__=[(Allow, Authenticated, "view")])
+            assert request.authenticated_userid == "foo"
+            assert "foo" in request.effective_principals
+            assert request.has_permission("view")
+            assert len(calls) == 1
+            assert request.matched_auth_policy == "remote_user"
+            assert request._selected_auth_policy is remote_user
+        finally:
+            testing.tearDown()
+
+
+class TestCeleryTaskContext:
+    def test_task_context_cleanup(self):
+        import sqlalchemy as sa
+        from pyramid.threadlocal import get_current_request
+        from sqlalchemy.orm import Session
+        from transaction.interfaces import NoTransaction
+        from testscaffold.celery import task_context
+
+        config = testing.setUp(
+            settings={"dbengine": sa.create_engine("sqlite://"), "base_url": "http://testscaffold.com"}
+        )
+        config.include("testscaffold.models")
+        try:
+            for finish in ("commit", None):
+                with mock.patch.object(Session, "close", autospec=True, side_effect=Session.close) as close:
+                    with task_context(config.registry) as request:
+                        assert get_current_request() is request
+                        assert request.application_url == "http://testscaffold.com"
+                        request.tm.begin()
+                        request.dbsession.execute("SELECT 1")
+                        if finish:
+                            getattr(request.tm, finish)()
+                assert close.call_count == 1
+                assert get_current_request() is not request
+                # unfinished transaction was aborted, none is left open
+                with pytest.raises(NoTransaction):
+                    request.tm.get()
+        finally:
+            testing.tearDown()
+
+
+class TestTieredCache:
+    def test_local_tier_disabled(self):
+        from dogpile.cache.api import NO_VALUE
+        from testscaffold.util.cache_regions import TieredCache
+
+        cache = TieredCache("test", region="redis_min_5", local_maxsize=0)
+        cache.set("key", 1)
+        # nothing kept in process, regions are not configured in this test
+        assert cache.get("key") is NO_VALUE
+        cached = TieredCache("test", region="redis_min_5", local_maxsize=10)
+        cached.set("key", 1)
+        assert cached.get("key") == 1
+        cached.delete("key")
+        assert cached.get("key") is NO_VALUE
+
+
+class TestFastJSON:
+    def test_adapters_match_pyramid_renderer(self):
+        import datetime
+        import uuid
+        from pyramid.renderers import JSON
+        from testscaffold.renderers import FastJSON
+
+        value = {
+            "created": datetime.datetime(2020, 1, 2, 3, 4, 5, 600000),
+            "day": datetime.date(2020, 1, 2),
+            "uuid": uuid.UUID(int=1),
+        }
+        adapters = [
+            (datetime.datetime, lambda obj, request: obj.strftime("%d.%m.%Y %H:%M")),
+            (datetime.date, lambda obj, request: obj.strftime("%d.%m.%Y")),
+            (uuid.UUID, lambda obj, request: obj.hex),
+        ]
+        expected = JSON(adapters=adapters, separators=(",", ":"))(None)(value, {})
+        for backend in ("stdlib", "orjson"):
+            renderer = FastJSON(backend=backend)
+            for type_or_iface, adapter in adapters:
+                renderer.add_adapter(type_or_iface, adapter)
+            assert renderer.dumps(value).decode("utf8") == expected
+            # datetime adapters alone are still served by orjson
+            renderer = FastJSON(backend=backend)
+            renderer.add_adapter(*adapters[0])
+            assert renderer.backend == backend
+            assert renderer.dumps({"created": value["created"]}) == b'{"created":"02.01.2020 03:04"}'
+
+
+class TestConditional:
+    def test_weak_etag(self):
+        import pyramid.httpexceptions
+        from pyramid.request import Request
+        from testscaffold.util.conditional import check_not_modified, make_etag
+
+        def make_request(url, **kwargs):
+            request = Request.blank(url, **kwargs)
+            request.registry = registry
+            return request
+
+        registry = testing.setUp().registry
+        try:
+            etag = make_etag("user", 1)
+            request = make_request("/")
+            check_not_modified(request, etag)
+            assert request.response.headers["ETag"] == 'W/"{}"'.format(etag)
+            for validator in (request.response.headers["ETag"], '"{}"'.format(etag)):
+                request = make_request("/?pretty=1", headers={"If-None-Match": validator})
+                with pytest.raises(pyramid.httpexceptions.HTTPNotModified) as exc:
+                    check_not_modified(request, etag)
+                assert exc.value.headers["ETag"] == 'W/"{}"'.format(etag)
+        finally:
+            testing.tearDown()
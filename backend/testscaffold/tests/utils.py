@@ -1,5 +1,8 @@
 from contextlib import contextmanager
 
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+
 from testscaffold.models import (
     Group,
     GroupPermission,
@@ -63,3 +66,18 @@ def tmp_session_context(session):
         session.rollback()
     finally:
         session.rollback()
+
+
+@contextmanager
+def count_queries():
+    """Collects SQL statements executed by any engine inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa.event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(Engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+
+from dogpile.cache.api import NO_VALUE
+from pyramid.exceptions import ConfigurationError
+from pyramid.interfaces import IRoutesMapper
+from pyramid.response import Response
+from pyramid.settings import aslist, asbool
+
+from testscaffold.services.resource_tree_service import tree_service
+from testscaffold.util.cache_regions import TieredCache
+
+log = logging.getLogger(__name__)
+
+# cookies that select response variant, any other cookie means client may
+# have a session or be signed in
+VARIANT_COOKIES = ("_LOCALE_",)
+# credentials that bypass the cache even without cookies
+AUTH_HEADERS = ("Authorization", "x-testscaffold-auth-token")
+
+response_cache = TieredCache("response_cache", region="redis_min_5", local_maxsize=256, local_ttl=5)
+
+# route name -> callables returning version of every data source the page
+# renders, routes without registered sources can't be cached
+RESPONSE_CACHE_SOURCES = {"/": (lambda request: tree_service.generation(),)}
+
+
+def is_cacheable_request(request):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if any(header in request.headers for header in AUTH_HEADERS):
+        return False
+    return all(name in VARIANT_COOKIES for name in request.cookies)
+
+
+def get_response_cache_route(request):
+    """
+    Name of cached route this request is served for or None, such requests
+    render pages without session, flash messages and forms carrying CSRF tokens
+    """
+    settings = request.registry.settings
+    if not asbool(settings.get("response_cache.enabled", False)) or not is_cacheable_request(request):
+        return None
+    route = request.registry.getUtility(IRoutesMapper)(request)["route"]
+    if route is None or route.name not in aslist(settings.get("response_cache.routes", "/")):
+        return None
+    return route.name
+
+
+def response_cache_key(request, route_name):
+    """
+    Variant key - includes versions of all content sources of the route,
+    so content changes switch to new keys
+    """
+    parts = [route_name, request.query_string]
+    parts.extend(str(source(request)) for source in RESPONSE_CACHE_SOURCES[route_name])
+    parts.extend(request.cookies.get(name, "") for name in VARIANT_COOKIES)
+    return "{}:{}".format(route_name, hashlib.sha1("|".join(parts).encode("utf8")).hexdigest())
+
+
+def response_cache_tween_factory(handler, registry):
+    """
+    Serves rendered pages for anonymous cookie-less requests from
+    `response_cache` before session, subscribers or views run.
+
+    Pages rendered for the cache don't touch the session, login form is
+    replaced with links to pages that render it. Responses that set cookies
+    anyway are passed through untouched and never stored.
+    """
+    settings = registry.settings
+    if not asbool(settings.get("response_cache.enabled", False)):
+        return handler
+    for route_name in aslist(settings.get("response_cache.routes", "/")):
+        if route_name not in RESPONSE_CACHE_SOURCES:
+            raise ConfigurationError("response_cache.routes: no content sources registered for {}".format(route_name))
+
+    def response_cache_tween(request):
+        route_name = request.response_cache_route
+        if route_name is None:
+            return handler(request)
+
+        statsd_client = getattr(registry, "statsd_client", None)
+        tags = ["route:{}".format(route_name)]
+        key = response_cache_key(request, route_name)
+        cached = response_cache.get(key)
+        if cached is not NO_VALUE:
+            if statsd_client:
+                statsd_client.increment("response_cache.hit", tags=tags)
+            status, headerlist, body = cached
+            response = Response(status=status, headerlist=list(headerlist), body=body)
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+        if statsd_client:
+            statsd_client.increment("response_cache.miss", tags=tags)
+        response = handler(request)
+        if "Set-Cookie" in response.headers:
+            log.warning("response_cache_skip_cookies", extra={"route": route_name})
+            return response
+        response.vary = tuple(response.vary or ()) + ("Cookie",)
+        if response.status_code == 200 and request.method == "GET":
+            log.debug("response_cache_store", extra={"route": route_name, "key": key})
+            headerlist = [(name, value) for name, value in response.headerlist if name != "Content-Length"]
+            response_cache.set(key, (response.status, headerlist, response.body))
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    return response_cache_tween
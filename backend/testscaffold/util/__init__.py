@@ -11,3 +11,8 @@ def safe_integer(integer):
 def session_provider(request):
     """ provides sqlalchemy session for ziggurat_foundations """
     return request.dbsession
+
+
+def escape_like(value, escape_char="\\"):
+    """ escapes LIKE wildcards so user input is matched literally """
+    return value.replace(escape_char, escape_char * 2).replace("%", escape_char + "%").replace("_", escape_char + "_")
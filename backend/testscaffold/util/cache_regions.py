@@ -1,11 +1,20 @@
 import copy
 import hashlib
 import inspect
+import threading
+import time
+from collections import OrderedDict
 
+import sqlalchemy as sa
 from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
+from sqlalchemy.orm import Session
 
 regions = None
 
+# (cache, key) pairs that need to be deleted again once transaction commits
+PENDING_DELETES_KEY = "testscaffold.cache_pending_deletes"
+
 
 def key_mangler(key):
     return "testscaffold:dogpile:{}".format(key)
@@ -67,3 +76,122 @@ class CacheRegions:
 
 def get_region(region):
     return getattr(regions, region)
+
+
+class LocalLRUCache:
+    """
+    Thread-safe in-process LRU cache where every key expires after `ttl` seconds
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return NO_VALUE
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return NO_VALUE
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """
+    Two level cache - in-process LRU backed by shared dogpile region.
+
+    The region is looked up lazily by name so instances can be created at
+    import time, before `main()` configures `regions`. When regions are not
+    configured (scripts, unit tests) only the local tier is used.
+
+    Deleting a key removes it from redis and from this process, other
+    processes will drop their local copy after `local_ttl` seconds, so keep it
+    short for data that needs fast invalidation. `local_maxsize=0` disables
+    the local tier for data that must be invalidated everywhere at once.
+    """
+
+    def __init__(self, namespace, region, local_maxsize=1024, local_ttl=5):
+        self.namespace = namespace
+        self.region_name = region
+        self.local = LocalLRUCache(maxsize=local_maxsize, ttl=local_ttl) if local_maxsize else None
+
+    @property
+    def region(self):
+        if regions is None:
+            return None
+        return get_region(self.region_name)
+
+    def make_key(self, key):
+        return "{}:{}".format(self.namespace, key)
+
+    def get(self, key):
+        key = self.make_key(key)
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not NO_VALUE:
+                return value
+        region = self.region
+        if region is None:
+            return NO_VALUE
+        value = region.get(key)
+        if value is not NO_VALUE and self.local is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        key = self.make_key(key)
+        if self.local is not None:
+            self.local.set(key, value)
+        region = self.region
+        if region is not None:
+            region.set(key, value)
+
+    def delete(self, key):
+        key = self.make_key(key)
+        if self.local is not None:
+            self.local.delete(key)
+        region = self.region
+        if region is not None:
+            region.delete(key)
+
+    def delete_on_commit(self, key, db_session=None):
+        """
+        Deletes key now and once more after the transaction commits, so
+        concurrent requests can't re-cache stale rows before commit
+        """
+        self.delete(key)
+        if db_session is not None:
+            db_session.info.setdefault(PENDING_DELETES_KEY, []).append((self, key))
+
+
+@sa.event.listens_for(Session, "after_commit")
+def _delete_committed_keys(session):
+    for cache, key in session.info.pop(PENDING_DELETES_KEY, ()):
+        cache.delete(key)
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def _discard_pending_deletes(session):
+    session.info.pop(PENDING_DELETES_KEY, None)
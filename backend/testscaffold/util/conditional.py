@@ -0,0 +1,47 @@
+import datetime
+import hashlib
+import logging
+
+import pyramid.httpexceptions
+
+log = logging.getLogger(__name__)
+
+# response headers repeated in 304 responses
+NOT_MODIFIED_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def make_etag(*parts):
+    """ validator built from cheap version information like ids, timestamps and counts """
+    source = "|".join(str(part) for part in parts)
+    return hashlib.sha1(source.encode("utf8")).hexdigest()
+
+
+def check_not_modified(request, etag, last_modified=None):
+    """
+    Sets ETag/Last-Modified headers and raises HTTPNotModified when client
+    copy is current, meant to run before objects are loaded and serialized.
+    ETags are weak because compact and `?pretty=1` renderings are equivalent
+    but not byte identical, If-None-Match always uses weak comparison.
+    """
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+        # http dates have second precision
+        last_modified = last_modified.replace(microsecond=0)
+    response = request.response
+    response.headers["ETag"] = 'W/"{}"'.format(etag)
+    response.last_modified = last_modified
+    # clients have to revalidate, data depends on who is asking
+    response.cache_control = "private, no-cache"
+
+    if "If-None-Match" in request.headers:
+        # If-None-Match takes precedence over If-Modified-Since, webob strips
+        # W/ prefixes so weak and strong client validators both match
+        not_modified = etag in request.if_none_match
+    elif request.if_modified_since is not None and last_modified is not None:
+        not_modified = last_modified <= request.if_modified_since
+    else:
+        not_modified = False
+    if not_modified:
+        headers = [(key, value) for key, value in response.headers.items() if key in NOT_MODIFIED_HEADERS]
+        raise pyramid.httpexceptions.HTTPNotModified(headers=headers)
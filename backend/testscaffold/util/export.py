@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import logging
+
+import pyramid.httpexceptions
+from pyramid.response import Response
+
+from testscaffold.validation.dumpers import dump_schema, get_dumper
+
+log = logging.getLogger(__name__)
+
+# rows fetched from server side cursor and written to client at once
+EXPORT_CHUNK_SIZE = 500
+
+
+class NDJSONWriter:
+    content_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def header(self):
+        return ""
+
+    def rows(self, items):
+        return "".join(json.dumps(item, default=str) + "\n" for item in items)
+
+
+class CSVWriter:
+    content_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def _write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    def header(self):
+        return self._write([self.fields])
+
+    def rows(self, items):
+        return self._write([[item.get(field) for field in self.fields] for item in items])
+
+
+EXPORT_WRITERS = {"ndjson": NDJSONWriter, "csv": CSVWriter}
+
+
+def export_chunks(query, session_factory, dumper, writer, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Generator used as WSGI app_iter, runs query in own session because
+    request transaction is already finished when response body is consumed
+    """
+    db_session = session_factory()
+    try:
+        yield writer.header().encode("utf8")
+        rows = query.with_session(db_session).yield_per(chunk_size)
+        chunk = []
+        for row in rows:
+            chunk.append(dumper(row))
+            if len(chunk) >= chunk_size:
+                yield writer.rows(chunk).encode("utf8")
+                chunk = []
+        if chunk:
+            yield writer.rows(chunk).encode("utf8")
+    finally:
+        # also reached when client disconnects and server closes app_iter
+        db_session.close()
+
+
+def export_response(request, query, schema_cls, name, export_format="ndjson"):
+    """ returns streaming response with `query` rows serialized by `schema_cls` """
+    writer_cls = EXPORT_WRITERS.get(export_format)
+    if writer_cls is None:
+        raise pyramid.httpexceptions.HTTPBadRequest()
+    writer = writer_cls(list(dump_schema(schema_cls).dump_fields))
+    session_factory = request.registry["dbsession_factory"]
+    log.info("export", extra={"export_name": name, "format": export_format})
+    return Response(
+        app_iter=export_chunks(query, session_factory, get_dumper(schema_cls), writer),
+        content_type=writer.content_type,
+        charset="utf8",
+        content_disposition='attachment; filename="{}.{}"'.format(name, writer.extension),
+    )
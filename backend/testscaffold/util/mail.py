@@ -0,0 +1,115 @@
+import logging
+import smtplib
+import threading
+import time
+
+from pyramid_mailer import get_mailer
+from pyramid_mailer.interfaces import IMailer
+from pyramid_mailer.mailer import DummyMailer, Mailer
+from repoze.sendmail.mailer import HAVE_SSL, Message, SSLError, encode_message
+
+log = logging.getLogger(__name__)
+
+
+class PooledSMTPMailer:
+    """
+    Wraps repoze.sendmail SMTPMailer so the connection stays open between
+    messages, celery worker sends all its mail through one connection that
+    is replaced after `max_idle` seconds or `max_messages` messages
+    """
+
+    def __init__(self, smtp_mailer, max_idle=30, max_messages=100):
+        self.smtp_mailer = smtp_mailer
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._connection = None
+        self._last_used = 0
+        self._sent = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """ same handshake and errors as `SMTPMailer.send` """
+        mailer = self.smtp_mailer
+        connection = mailer.smtp_factory()
+        code, response = connection.ehlo()
+        if code < 200 or code >= 300:
+            code, response = connection.helo()
+            if code < 200 or code >= 300:
+                raise RuntimeError("Error sending HELO to the SMTP server (code=%s, response=%s)" % (code, response))
+
+        have_tls = connection.has_extn("starttls")
+        if not have_tls and mailer.force_tls:
+            raise RuntimeError("TLS is not available but TLS is required")
+        if have_tls and HAVE_SSL and not mailer.no_tls:
+            connection.starttls()
+            connection.ehlo()
+
+        if connection.does_esmtp:
+            if mailer.username is not None and mailer.password is not None:
+                connection.login(mailer.username, mailer.password)
+        elif mailer.username:
+            raise RuntimeError("Mailhost does not support ESMTP but a username is configured")
+        log.debug("smtp_connect", extra={"host": mailer.hostname})
+        return connection
+
+    def connection(self):
+        expired = time.monotonic() - self._last_used > self.max_idle or self._sent >= self.max_messages
+        if self._connection is not None and expired:
+            self.close()
+        if self._connection is None:
+            self._connection = self._connect()
+            self._sent = 0
+        return self._connection
+
+    def send(self, fromaddr, toaddrs, message):
+        if not isinstance(message, Message):
+            raise ValueError("Message must be instance of email.message.Message")
+        message = encode_message(message)
+        with self._lock:
+            try:
+                self.connection().sendmail(fromaddr, toaddrs, message)
+            except smtplib.SMTPServerDisconnected:
+                # server dropped idle connection, retry once on fresh one
+                self.close()
+                self.connection().sendmail(fromaddr, toaddrs, message)
+            self._sent += 1
+            self._last_used = time.monotonic()
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, SSLError, OSError):
+            connection.close()
+
+
+def mailer_from_settings(settings):
+    """
+    `mailing.backend = smtp` sends through pooled connection,
+    `local` keeps messages in `outbox` of DummyMailer for tests
+    """
+    backend = settings.get("mailing.backend", "smtp")
+    if backend == "local":
+        return DummyMailer()
+    if backend != "smtp":
+        raise ValueError("Unknown mailing.backend: {}".format(backend))
+    mailer = Mailer.from_settings(settings)
+    pooled = PooledSMTPMailer(
+        mailer.smtp_mailer,
+        max_idle=int(settings.get("mailing.smtp_max_idle", 30)),
+        max_messages=int(settings.get("mailing.smtp_max_messages", 100)),
+    )
+    return Mailer(
+        smtp_mailer=pooled,
+        sendmail_mailer=mailer.sendmail_mailer,
+        queue_path=mailer.queue_path,
+        default_sender=mailer.default_sender,
+    )
+
+
+def includeme(config):
+    """ used instead of `config.include("pyramid_mailer")` """
+    config.registry.registerUtility(mailer_from_settings(config.registry.settings), IMailer)
+    config.add_request_method(get_mailer, "mailer", reify=True)
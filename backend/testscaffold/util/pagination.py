@@ -0,0 +1,66 @@
+import base64
+import json
+
+from pyramid.httpexceptions import HTTPBadRequest
+
+
+def encode_cursor(data):
+    """ opaque, url safe representation of cursor position """
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode("utf8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """ raises HTTPBadRequest for cursors that were not generated by us """
+    if not cursor:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPBadRequest()
+    if not isinstance(data, dict) or not set(data.keys()) <= {"after", "before"}:
+        raise HTTPBadRequest()
+    if not all(isinstance(value, int) for value in data.values()):
+        raise HTTPBadRequest()
+    return data
+
+
+class KeysetPage:
+    """
+    Cursor based page - instead of OFFSET it filters on unique, indexed
+    `key_column` so every page costs the same regardless of depth.
+
+    Total count is not computed here, callers can pass precomputed `item_count`.
+    """
+
+    is_keyset = True
+
+    def __init__(self, query, key_column, cursor=None, items_per_page=50, item_count=None, count_mode=None):
+        self.items_per_page = items_per_page
+        self.item_count = item_count
+        self.count_mode = count_mode
+        self.cursor = cursor or ""
+        position = decode_cursor(cursor)
+        key_name = key_column.key
+        query = query.order_by(None)
+        backwards = "before" in position
+        if backwards:
+            query = query.filter(key_column < position["before"]).order_by(key_column.desc())
+        else:
+            if position.get("after") is not None:
+                query = query.filter(key_column > position["after"])
+            query = query.order_by(key_column)
+        # one extra row tells us if there is anything past this page
+        rows = query.limit(items_per_page + 1).all()
+        has_more = len(rows) > items_per_page
+        rows = rows[:items_per_page]
+        if backwards:
+            rows.reverse()
+        self.items = rows
+
+        self.next_cursor = None
+        self.prev_cursor = None
+        if rows:
+            if has_more or backwards:
+                self.next_cursor = encode_cursor({"after": getattr(rows[-1], key_name)})
+            if (has_more and backwards) or (not backwards and position.get("after") is not None):
+                self.prev_cursor = encode_cursor({"before": getattr(rows[0], key_name)})
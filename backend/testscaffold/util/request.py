@@ -3,11 +3,16 @@ import logging
 
 from authomatic import Authomatic
 from authomatic.providers import oauth2, oauth1
+from pyramid.settings import asbool
 
 from testscaffold.exceptions import JSONException
+from testscaffold.services.permission_snapshot import BUILD_QUERY_COUNT, PermissionSnapshotService
 
 log = logging.getLogger(__name__)
 
+# requests under this path never load beaker session
+API_PATH_PREFIX = "/api/"
+
 
 def get_user(request):
     # call to `request.authenticated_userid` will trigger grupfinder callback
@@ -17,6 +22,127 @@ def get_user(request):
         return getattr(request, "_reified_user_obj", None)
 
 
+def resolve_effective_permissions(request, user):
+    """
+    Returns permission snapshot for user, it is resolved once and stored on
+    request, `groupfinder` uses this directly because `request.user` is not
+    available yet when it runs
+    """
+    snapshot = getattr(request, "_effective_permissions", None)
+    if snapshot is None or snapshot.user_id != user.id:
+        snapshot = PermissionSnapshotService.get_cached(user.id)
+        if snapshot is None:
+            snapshot = PermissionSnapshotService.build(user, db_session=request.dbsession)
+            PermissionSnapshotService.store(snapshot)
+            count_permission_queries(request, BUILD_QUERY_COUNT)
+        request._effective_permissions = snapshot
+    return snapshot
+
+
+def get_effective_permissions(request):
+    """
+    Permission snapshot for current user or None for anonymous requests,
+    shared by root factories, `allow_root_access` and templates
+    """
+    user = request.user
+    if not user:
+        return None
+    return resolve_effective_permissions(request, user)
+
+
+def count_permission_queries(request, queries=1):
+    """
+    Records how many permission related queries were run during request,
+    the total is logged and sent to statsd when request finishes
+    """
+    if not hasattr(request, "permission_query_count"):
+        request.permission_query_count = 0
+        request.add_finished_callback(_report_permission_queries)
+    request.permission_query_count += queries
+
+
+def _report_permission_queries(request):
+    log.debug("permission_queries", extra={"count": request.permission_query_count, "path": request.path})
+    statsd_client = getattr(request.registry, "statsd_client", None)
+    if statsd_client:
+        statsd_client.histogram("permission_queries", request.permission_query_count)
+
+
+def record_schema_timing(request, phase, seconds):
+    """
+    Accumulates time spent constructing schemas and dumping data during
+    request, reported like permission queries when request finishes
+    """
+    if request is None:
+        return
+    if not hasattr(request, "schema_timings"):
+        request.schema_timings = {"construct": 0.0, "dump": 0.0}
+        request.add_finished_callback(_report_schema_timings)
+    request.schema_timings[phase] += seconds
+
+
+def _report_schema_timings(request):
+    timings = {phase: round(seconds * 1000, 3) for phase, seconds in request.schema_timings.items()}
+    log.debug(
+        "schema_timings", extra={"path": request.path, "construct_ms": timings["construct"], "dump_ms": timings["dump"]}
+    )
+    statsd_client = getattr(request.registry, "statsd_client", None)
+    if statsd_client:
+        statsd_client.timing("schema_construct", timings["construct"])
+        statsd_client.timing("schema_dump", timings["dump"])
+
+
+def is_stateless_request(request):
+    """
+    API calls and token authenticated requests don't use flash messages or
+    XSRF cookie, subscribers skip session work for them so it is only
+    loaded if a view reads it explicitly
+    """
+    if not asbool(request.registry.settings.get("stateless_api.enabled", False)):
+        return False
+    if request.headers.get("x-testscaffold-auth-token"):
+        return True
+    return request.path_info.startswith(API_PATH_PREFIX)
+
+
+def flash(request, msg, queue=""):
+    """ flash messages are only displayed on rendered pages, stateless requests drop them """
+    if request.stateless:
+        return
+    request.session.flash(msg, queue)
+
+
+def track_session_operations(request):
+    """
+    Starts counting beaker session loads and saves, each of them is at
+    least one redis round trip, totals are reported when request finishes
+    """
+    request.session_operations = {"load": 0, "save": 0}
+    request.add_finished_callback(_report_session_operations)
+
+
+def count_session_operation(request, operation):
+    operations = getattr(request, "session_operations", None)
+    if operations is not None:
+        operations[operation] += 1
+
+
+def _report_session_operations(request):
+    operations = request.session_operations
+    stateless = request.stateless
+    # before stateless mode subscribers always loaded existing session and saved it
+    expected = 1 + int(request.registry.settings.get("beaker.session.key", "beaker.session.id") in request.cookies)
+    saved = max(expected - operations["load"] - operations["save"], 0) if stateless else 0
+    log.debug(
+        "session_operations", extra={"path": request.path, "stateless": stateless, "saved": saved, **operations},
+    )
+    statsd_client = getattr(request.registry, "statsd_client", None)
+    if statsd_client:
+        tags = ["stateless:{}".format(str(stateless).lower())]
+        statsd_client.histogram("session_operations", operations["load"] + operations["save"], tags=tags)
+        statsd_client.histogram("session_round_trips_saved", saved, tags=tags)
+
+
 def safe_json_body(request):
     """
     Returns None if json body is missing or erroneous
@@ -65,6 +191,37 @@ def get_authomatic(request):
     return Authomatic(config=authomatic_conf, secret=settings["authomatic.secret"])
 
 
+def gen_keyset_pagination_headers(request, paginator):
+    """
+    Generate pagination headers from keyset paginator, total count is only
+    present if it was computed
+    :param request:
+    :param paginator:
+    :return:
+    """
+    headers = {"x-items-per-page": str(paginator.items_per_page)}
+    if paginator.item_count is not None:
+        headers["x-total-count"] = str(paginator.item_count)
+        headers["x-total-count-mode"] = paginator.count_mode
+    params_dict = request.GET.dict_of_lists()
+    first_page_params = copy.deepcopy(params_dict)
+    first_page_params["cursor"] = ""
+    fp_url = request.current_route_url(_query=first_page_params)
+    links = ['rel="first", <{}>'.format(fp_url)]
+    if paginator.prev_cursor:
+        prev_page_params = copy.deepcopy(params_dict)
+        prev_page_params["cursor"] = paginator.prev_cursor
+        prev_url = request.current_route_url(_query=prev_page_params)
+        links.append('rel="prev", <{}>'.format(prev_url))
+    if paginator.next_cursor:
+        next_page_params = copy.deepcopy(params_dict)
+        next_page_params["cursor"] = paginator.next_cursor
+        next_url = request.current_route_url(_query=next_page_params)
+        links.append('rel="next", <{}>'.format(next_url))
+    headers["link"] = "; ".join(links)
+    return headers
+
+
 def gen_pagination_headers(request, paginator):
     """
     Generate pagination headers from paginator
@@ -72,12 +229,18 @@ def gen_pagination_headers(request, paginator):
     :param paginator:
     :return:
     """
+    if getattr(paginator, "is_keyset", False):
+        return gen_keyset_pagination_headers(request, paginator)
     headers = {
         "x-total-count": str(paginator.item_count),
         "x-current-page": str(paginator.page),
         "x-items-per-page": str(paginator.items_per_page),
         "x-pages": str(paginator.page_count),
     }
+    # exact, cached or estimate - see CountService
+    count_mode = getattr(paginator, "count_mode", None)
+    if count_mode:
+        headers["x-total-count-mode"] = count_mode
     params_dict = request.GET.dict_of_lists()
     last_page_params = copy.deepcopy(params_dict)
     last_page_params["page"] = paginator.last_page or 1
@@ -0,0 +1,38 @@
+from pyramid_beaker import session_factory_from_settings, set_cache_regions_from_settings
+
+from testscaffold.util.request import count_session_operation
+
+
+def counting_session_factory(factory):
+    """
+    Wraps pyramid_beaker session factory so session backend loads and saves
+    are counted on request, session itself stays lazy
+    """
+
+    class CountingSessionObject(factory):
+        def __init__(self, request):
+            factory.__init__(self, request)
+            self.__dict__["_request"] = request
+
+        def _session(self):
+            if self.__dict__["_sess"] is None:
+                request = self.__dict__["_request"]
+                # session id from cookie is looked up in backend
+                if self.__dict__["_params"].get("key", "beaker.session.id") in request.cookies:
+                    count_session_operation(request, "load")
+            return factory._session(self)
+
+        def persist(self):
+            params = self.__dict__["_params"]
+            if self.dirty() or params.get("auto") or params.get("save_accessed_time", True):
+                count_session_operation(self.__dict__["_request"], "save")
+            return factory.persist(self)
+
+    return CountingSessionObject
+
+
+def includeme(config):
+    """ used instead of `config.include("pyramid_beaker")` """
+    settings = config.registry.settings
+    config.set_session_factory(counting_session_factory(session_factory_from_settings(settings)))
+    set_cache_regions_from_settings(settings)
@@ -1,3 +1,4 @@
+import sqlalchemy as sa
 import sqlalchemy.types as types
 
 import testscaffold.util.encryption as encryption
@@ -15,3 +16,14 @@ class EncryptedUnicode(types.TypeDecorator):
         if not value:
             return value
         return encryption.decrypt_fernet(value).decode("utf8")
+
+
+def identity_map_value(db_session, model, primary_key, attribute):
+    """
+    Value of attribute of instance already loaded in session, None if
+    instance is not in identity map or attribute is not loaded
+    """
+    instance = db_session.identity_map.get(sa.orm.util.identity_key(model, primary_key))
+    if instance is None or attribute in sa.inspect(instance).unloaded:
+        return None
+    return getattr(instance, attribute)
@@ -0,0 +1,103 @@
+import logging
+import time
+
+from marshmallow import Schema, fields, missing
+
+from testscaffold.util.request import record_schema_timing
+
+log = logging.getLogger(__name__)
+
+# exact field types that have inlined serialization, subclasses can
+# override `_serialize` so they go through generic marshmallow path
+INLINE_SERIALIZERS = {
+    fields.Integer: "int(value)",
+    fields.String: "str(value)",
+    fields.Boolean: "bool(value)",
+    fields.DateTime: "value.isoformat()",
+}
+
+_dump_schemas = {}
+_dumpers = {}
+
+
+def dump_schema(schema_cls):
+    """
+    Shared dump-only schema instance, safe to reuse between requests
+    because dumping does not depend on context
+    """
+    schema = _dump_schemas.get(schema_cls)
+    if schema is None:
+        schema = _dump_schemas[schema_cls] = schema_cls(context={})
+    return schema
+
+
+def _inline_expression(field_obj, attribute):
+    if type(field_obj) not in INLINE_SERIALIZERS or "." in attribute:
+        return None
+    if getattr(field_obj, "dump_default", getattr(field_obj, "default", missing)) is not missing:
+        return None
+    if isinstance(field_obj, fields.Integer) and field_obj.as_string:
+        return None
+    if isinstance(field_obj, fields.DateTime) and field_obj.format not in (None, "iso"):
+        return None
+    return INLINE_SERIALIZERS[type(field_obj)]
+
+
+def compile_dumper(schema_cls):
+    """
+    Generates function that serializes single object like
+    `schema_cls().dump(obj)`, simple fields are read and converted inline,
+    everything else is delegated to the field itself
+    """
+    schema = dump_schema(schema_cls)
+    if schema._has_processors("pre_dump") or schema._has_processors("post_dump"):
+        return schema.dump
+    if type(schema).get_attribute is not Schema.get_attribute:
+        return schema.dump
+
+    namespace = {"missing": missing, "get_attribute": schema.get_attribute}
+    lines = ["def dump(obj):", "    result = {}"]
+    for index, (attr_name, field_obj) in enumerate(schema.dump_fields.items()):
+        key = field_obj.data_key if field_obj.data_key is not None else attr_name
+        attribute = field_obj.attribute or attr_name
+        expression = _inline_expression(field_obj, attribute)
+        if expression is None:
+            namespace["field_{}".format(index)] = field_obj
+            lines.append("    value = field_{}.serialize({!r}, obj, accessor=get_attribute)".format(index, attr_name))
+            lines.append("    if value is not missing:")
+            lines.append("        result[{!r}] = value".format(key))
+        else:
+            lines.append("    value = getattr(obj, {!r}, missing)".format(attribute))
+            lines.append("    if value is not missing:")
+            lines.append("        result[{!r}] = None if value is None else {}".format(key, expression))
+    lines.append("    return result")
+    exec(compile("\n".join(lines), "<dumper {}>".format(schema_cls.__name__), "exec"), namespace)
+    return namespace["dump"]
+
+
+def get_dumper(schema_cls):
+    dumper = _dumpers.get(schema_cls)
+    if dumper is None:
+        dumper = _dumpers[schema_cls] = compile_dumper(schema_cls)
+    return dumper
+
+
+def dump(request, schema_cls, obj, many=False):
+    """ fast dump-only path, time spent is reported with request profile """
+    start = time.perf_counter()
+    dumper = get_dumper(schema_cls)
+    if many:
+        result = [dumper(item) for item in obj]
+    else:
+        result = dumper(obj)
+    record_schema_timing(request, "dump", time.perf_counter() - start)
+    return result
+
+
+def make_schema(request, schema_cls, **context):
+    """ schema instance for loading data, construction time is reported with request profile """
+    start = time.perf_counter()
+    context["request"] = request
+    schema = schema_cls(context=context)
+    record_schema_timing(request, "construct", time.perf_counter() - start)
+    return schema
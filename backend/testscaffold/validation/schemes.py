@@ -16,6 +16,19 @@ _ = TranslationStringFactory("testscaffold")
 user_regex_error = _("Username can only consist of " "alphanumerical characters, hypens and underscores")
 
 
+def schema_rows(data, many):
+    """ (index, row) pairs for `pass_many` validators, index is None for single object """
+    if many:
+        return list(enumerate(data))
+    return [(None, data)]
+
+
+def add_row_error(errors, index, field_name, msg):
+    """ builds same error structure marshmallow uses for field errors of single or many rows """
+    row_errors = errors if index is None else errors.setdefault(index, {})
+    row_errors.setdefault(field_name, []).append(msg)
+
+
 class BaseTestScaffoldSchema(Schema):
     class Meta:
         strict = True
@@ -29,45 +42,66 @@ class UserCreateSchema(BaseTestScaffoldSchema):
     user_name = fields.Str(
         required=True, validate=(validate.Length(3), validate.Regexp("^[\w-]*$", error=user_regex_error),),
     )
-    password = fields.Str(required=True, validate=(validate.Length(3)))
+    password = fields.Str(required=True, validate=(validate.Length(3)), load_only=True)
     email = fields.Str(required=True, validate=(validate.Email(error=_("Not a valid email"))))
     status = fields.Int(dump_only=True)
     last_login_date = fields.DateTime(dump_only=True)
     registered_date = fields.DateTime(dump_only=True)
 
-    @validates("user_name")
-    def validate_user_name(self, value):
+    @validates_schema(pass_many=True, skip_on_field_errors=False)
+    def validate_unique(self, data, many, **kwargs):
+        """
+        Checks user names and emails of every row in a single query,
+        works for single objects and `many=True` payloads
+        """
         request = self.context["request"]
         modified_obj = self.context.get("modified_obj")
-        user = UserService.by_user_name(value, db_session=request.dbsession)
+        rows = schema_rows(data, many)
+        users = UserService.by_user_names_or_emails(
+            [row.get("user_name") for _, row in rows],
+            [row.get("email") for _, row in rows],
+            db_session=request.dbsession,
+        )
+        by_user_name = dict((user.user_name.lower(), user) for user in users)
+        by_email = dict(((user.email or "").lower(), user) for user in users)
         by_admin = request.has_permission("root_administration")
-        if modified_obj and not by_admin and (modified_obj.user_name != value):
-            msg = _("Only administrator can change usernames")
-            raise validate.ValidationError(msg)
-        if user:
-            if not modified_obj or modified_obj.id != user.id:
-                msg = _("User already exists in database")
-                raise validate.ValidationError(msg)
-
-    @validates("email")
-    def validate_email(self, value):
-        request = self.context["request"]
-        modified_obj = self.context.get("modified_obj")
-        user = UserService.by_email(value, db_session=request.dbsession)
-        if user:
-            if not modified_obj or modified_obj.id != user.id:
-                msg = _("Email already exists in database")
-                raise validate.ValidationError(msg)
+        seen_user_names = set()
+        seen_emails = set()
+        errors = {}
+        for index, row in rows:
+            user_name = row.get("user_name")
+            if user_name:
+                user = by_user_name.get(user_name.lower())
+                if modified_obj and not by_admin and (modified_obj.user_name != user_name):
+                    add_row_error(errors, index, "user_name", _("Only administrator can change usernames"))
+                elif user and (not modified_obj or modified_obj.id != user.id):
+                    add_row_error(errors, index, "user_name", _("User already exists in database"))
+                elif user_name.lower() in seen_user_names:
+                    add_row_error(errors, index, "user_name", _("Duplicate user name in request"))
+                seen_user_names.add(user_name.lower())
+            email = row.get("email")
+            if email:
+                user = by_email.get(email.lower())
+                if user and (not modified_obj or modified_obj.id != user.id):
+                    add_row_error(errors, index, "email", _("Email already exists in database"))
+                elif email.lower() in seen_emails:
+                    add_row_error(errors, index, "email", _("Duplicate email in request"))
+                seen_emails.add(email.lower())
+        if errors:
+            raise validate.ValidationError(errors)
 
 
 class UserEditSchema(UserCreateSchema):
-    password = fields.Str(required=False, validate=(validate.Length(3)))
+    password = fields.Str(required=False, validate=(validate.Length(3)), load_only=True)
 
 
 class UserSearchSchema(BaseTestScaffoldSchema):
 
     user_name = fields.Str()
     user_name_like = fields.Str()
+    user_name_contains = fields.Str()
+    email_contains = fields.Str()
+    search = fields.Str()
 
     # @pre_load()
     # def make_object(self, data):
@@ -161,18 +195,50 @@ class EntryCreateSchemaAdmin(ResourceCreateSchemaMixin):
     owner_group_id = fields.Int()
 
 
+class EntryBulkOperationSchema(BaseTestScaffoldSchema):
+    """
+    Single operation of entries bulk endpoint, only shape is validated here,
+    tree and permission checks are done for whole batch by EntryBulkService
+    """
+
+    op = fields.Str(required=True, validate=validate.OneOf(["create", "patch", "move"]))
+    resource_id = fields.Int()
+    parent_id = fields.Int(allow_none=True)
+    resource_name = fields.Str(validate=(validate.Length(min=1, max=100)))
+    note = fields.Str()
+    ordering = fields.Int(validate=validate.Range(min=1))
+
+    @validates_schema
+    def validate_operation(self, data, **kwargs):
+        if data["op"] == "create":
+            if not data.get("resource_name"):
+                raise validate.ValidationError(_("Missing data for required field."), "resource_name")
+        elif data.get("resource_id") is None:
+            raise validate.ValidationError(_("Missing data for required field."), "resource_id")
+        if data["op"] == "move" and "parent_id" not in data and "ordering" not in data:
+            raise validate.ValidationError(_("Move requires parent_id or ordering"), "parent_id")
+
+
 class UserResourcePermissionSchema(BaseTestScaffoldSchema):
 
     user_name = fields.Str(required=True)
 
     perm_name = fields.Str(required=True)
 
-    @validates("user_name")
-    def validate_user_name(self, value):
+    @validates_schema(pass_many=True, skip_on_field_errors=False)
+    def validate_user_names(self, data, many, **kwargs):
+        """ resolves users of all rows in one query, found users are kept in context["users"] """
         request = self.context["request"]
-        user = UserService.by_user_name(value, db_session=request.dbsession)
-        if not user:
-            raise validate.ValidationError(_("User not found"))
+        rows = schema_rows(data, many)
+        user_names = [row.get("user_name") for _, row in rows]
+        users = UserService.by_user_names_or_emails(user_names, db_session=request.dbsession)
+        self.context["users"] = dict((user.user_name.lower(), user) for user in users)
+        errors = {}
+        for index, row in rows:
+            if row.get("user_name") and row["user_name"].lower() not in self.context["users"]:
+                add_row_error(errors, index, "user_name", _("User not found"))
+        if errors:
+            raise validate.ValidationError(errors)
 
     @validates("perm_name")
     def validate_perm_name(self, value):
@@ -187,12 +253,19 @@ class GroupResourcePermissionSchema(BaseTestScaffoldSchema):
 
     perm_name = fields.Str(required=True)
 
-    @validates("group_id")
-    def validate_group_id(self, value):
+    @validates_schema(pass_many=True, skip_on_field_errors=False)
+    def validate_group_ids(self, data, many, **kwargs):
+        """ resolves groups of all rows in one query, found groups are kept in context["groups"] """
         request = self.context["request"]
-        group = GroupService.get(value, db_session=request.dbsession)
-        if not group:
-            raise validate.ValidationError(_("Group not found"))
+        rows = schema_rows(data, many)
+        groups = GroupService.by_ids([row.get("group_id") for _, row in rows], db_session=request.dbsession)
+        self.context["groups"] = dict((group.id, group) for group in groups)
+        errors = {}
+        for index, row in rows:
+            if row.get("group_id") is not None and row["group_id"] not in self.context["groups"]:
+                add_row_error(errors, index, "group_id", _("Group not found"))
+        if errors:
+            raise validate.ValidationError(errors)
 
     @validates("perm_name")
     def validate_perm_name(self, value):
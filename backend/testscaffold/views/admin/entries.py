@@ -11,6 +11,8 @@ from testscaffold.models.db import Entry
 from testscaffold.services.group import GroupService
 from testscaffold.services.resource import ResourceService
 from testscaffold.services.resource_tree_service import tree_service
+from testscaffold.util import safe_integer
+from testscaffold.util.request import gen_pagination_headers
 from testscaffold.validation.forms import (
     UserResourcePermissionForm,
     GroupResourcePermissionForm,
@@ -27,15 +29,25 @@ log = logging.getLogger(__name__)
 _ = TranslationStringFactory("testscaffold")
 
 
-def get_possible_parents(request):
-    result = tree_service.from_parent_deeper(db_session=request.dbsession)
-
+def get_possible_parents(request, selected_ids=()):
+    """
+    Only root and currently selected parents are rendered inline,
+    the rest is searched through `parent_choices` endpoint
+    """
+    index = tree_service.cached_index(db_session=request.dbsession)
     choices = [("", request.localizer.translate(_("Root (/)")))]
-    for row in result:
-        choices.append((row.Resource.resource_id, "{} {}".format("--" * row.depth, row.Resource.resource_name),))
+    selected_ids = set(safe_integer(resource_id) for resource_id in selected_ids if resource_id)
+    for resource_id in sorted(selected_ids):
+        node = index.get(resource_id)
+        if node is not None:
+            choices.append((node.resource_id, parent_choice_label(node)))
     return choices
 
 
+def parent_choice_label(node):
+    return "{} {}".format("--" * node.depth, node.resource_name)
+
+
 @view_defaults(route_name="admin_objects", permission="admin_entries")
 class AdminEntriesViews(BaseView):
     def __init__(self, request):
@@ -46,18 +58,30 @@ class AdminEntriesViews(BaseView):
         renderer="testscaffold:templates/admin/entries/index.jinja2", match_param=("object=entries", "verb=GET"),
     )
     def collection_list(self):
-        result = tree_service.from_parent_deeper(db_session=self.request.dbsession)
-        entries_tree = tree_service.build_subtree_strut(result)
+        entries_tree = tree_service.cached_subtree(db_session=self.request.dbsession)
 
         return {"entries_tree": entries_tree}
 
+    @view_config(renderer="json", match_param=("object=entries", "verb=parent_choices"))
+    def parent_choices(self):
+        """ paged, searchable source for parent dropdown """
+        request = self.request
+        page = safe_integer(request.GET.get("page", 1))
+        paginator = self.shared.parent_choices(request.GET.get("q"), page=page)
+        request.response.headers.update(gen_pagination_headers(request=request, paginator=paginator))
+        request.response.headers["x-tree-version"] = tree_service.generation()
+        return [
+            {"id": node.resource_id, "label": parent_choice_label(node), "depth": node.depth}
+            for node in paginator.items
+        ]
+
     @view_config(
         renderer="testscaffold:templates/admin/entries/edit.jinja2", match_param=("object=entries", "verb=POST"),
     )
     def post(self):
         request = self.request
         resource_form = EntryCreateForm(request.POST, context={"request": request})
-        choices = get_possible_parents(self.request)
+        choices = get_possible_parents(self.request, selected_ids=[request.POST.get("parent_id")])
         resource_form.parent_id.choices = choices
 
         if request.method == "POST" and resource_form.validate():
@@ -107,7 +131,7 @@ class AdminEntryViews(BaseView):
         request = self.request
         resource = self.request.context.resource
 
-        breadcrumbs = tree_service.path_upper(resource.resource_id, db_session=self.request.dbsession)
+        breadcrumbs = tree_service.cached_path_upper(resource.resource_id, db_session=self.request.dbsession)
 
         user_permission_form = UserResourcePermissionForm(request.POST, context={"request": request})
 
@@ -126,7 +150,9 @@ class AdminEntryViews(BaseView):
         user_permissions_grid = ResourceUserPermissionsGrid(user_permissions, request=request)
         group_permissions_grid = ResourceGroupPermissionsGrid(group_permissions, request=request)
 
-        parent_id_choices = get_possible_parents(self.request)
+        parent_id_choices = get_possible_parents(
+            self.request, selected_ids=[resource.parent_id, request.POST.get("parent_id")]
+        )
         resource_form = EntryUpdateForm(
             request.POST, obj=resource, context={"request": request, "modified_obj": resource},
         )
@@ -2,6 +2,7 @@ import logging
 
 from pyramid.view import view_config, view_defaults
 
+from testscaffold.services.count import CountService
 from testscaffold.services.user import UserService
 from testscaffold.views import BaseView
 
@@ -13,11 +14,13 @@ class AdminPanelView(BaseView):
     @view_config(renderer="testscaffold:templates/admin/index.jinja2")
     def index(self):
         request = self.request
-        total_registered_users = UserService.total_count(db_session=request.dbsession)
+        count_mode = CountService.mode_for(request.registry.settings, "admin_dashboard")
+        total_registered_users = UserService.total_count(count_mode=count_mode, db_session=request.dbsession)
         latest_logged_user = UserService.latest_logged_user(db_session=request.dbsession)
         latest_registered_user = UserService.latest_registered_user(db_session=request.dbsession)
         return {
             "total_registered_users": total_registered_users,
+            "total_registered_users_mode": count_mode,
             "latest_logged_user": latest_logged_user,
             "latest_registered_user": latest_registered_user,
         }
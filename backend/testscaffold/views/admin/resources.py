@@ -42,7 +42,7 @@ class AdminResourceRelationsView(BaseView):
             "perm_name": self.request.POST.get("perm_name"),
         }
         data = schema.load(data)
-        user = UserService.by_user_name(data["user_name"], db_session=self.request.dbsession)
+        user = schema.context["users"][data["user_name"].lower()]
 
         perm_inst = self.shared.user_permission_post(resource, user.id, data["perm_name"])
         location = came_from or request.route_url("admin")
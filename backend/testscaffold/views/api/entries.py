@@ -4,6 +4,8 @@ from __future__ import absolute_import
 
 import logging
 
+from pyramid.security import NO_PERMISSION_REQUIRED
+from pyramid.settings import asbool
 from pyramid.view import view_config, view_defaults
 from ziggurat_foundations import noop
 
@@ -11,6 +13,7 @@ from testscaffold.models.db import Entry
 from testscaffold.services.resource_tree_service import tree_service
 from testscaffold.util import safe_integer
 from testscaffold.util.request import gen_pagination_headers
+from testscaffold.validation.dumpers import dump, make_schema
 from testscaffold.validation.schemes import EntryCreateSchema
 from testscaffold.views import BaseView
 from testscaffold.views.shared.entries import EntriesShared
@@ -34,17 +37,51 @@ class EntriesAPIView(BaseView):
 
     @view_config(route_name="api_objects", request_method="GET")
     def collection_list(self):
-        schema = EntryCreateSchema(context={"request": self.request})
         page = safe_integer(self.request.GET.get("page", 1))
         filter_params = self.request.GET.mixed()
-        entries_paginator = self.shared.collection_list(page=page, filter_params=filter_params)
+        self.shared.check_collection_not_modified(filter_params)
+        # passing `cursor` switches to keyset pagination
+        entries_paginator = self.shared.collection_list(
+            page=page,
+            filter_params=filter_params,
+            cursor=self.request.GET.get("cursor"),
+            with_count=asbool(self.request.GET.get("count")),
+        )
         headers = gen_pagination_headers(request=self.request, paginator=entries_paginator)
         self.request.response.headers.update(headers)
-        return schema.dump(entries_paginator.items, many=True)
+        return dump(self.request, EntryCreateSchema, entries_paginator.items, many=True)
+
+    @view_config(route_name="api_objects_export", request_method="GET")
+    def export(self):
+        """ streams all matching entries, `format` is ndjson (default) or csv """
+        filter_params = self.request.GET.mixed()
+        export_format = filter_params.pop("format", "ndjson")
+        return self.shared.export(filter_params=filter_params, export_format=export_format)
+
+    @view_config(route_name="api_objects_search", request_method="GET", permission=NO_PERMISSION_REQUIRED)
+    def search(self):
+        """ results are filtered to entries that caller can view """
+        page = safe_integer(self.request.GET.get("page", 1))
+        paginator = self.shared.search(self.request.GET.get("q"), page=page)
+        headers = gen_pagination_headers(request=self.request, paginator=paginator)
+        self.request.response.headers.update(headers)
+        results = dump(self.request, EntryCreateSchema, [entry for entry, rank in paginator.items], many=True)
+        for result, (entry, rank) in zip(results, paginator.items):
+            result["rank"] = rank
+        return results
+
+    @view_config(route_name="api_objects_bulk", request_method="POST")
+    def bulk(self):
+        """ list of create/patch/move operations applied in one transaction """
+        results = self.shared.bulk(self.request.unsafe_json_body)
+        for index, result in enumerate(results):
+            result["index"] = index
+            result["status"] = "ok"
+        return results
 
     @view_config(route_name="api_objects", request_method="POST")
     def post(self):
-        schema = EntryCreateSchema(context={"request": self.request})
+        schema = make_schema(self.request, EntryCreateSchema)
         data = schema.load(self.request.unsafe_json_body)
         resource = Entry()
         self.shared.populate_instance(resource, data)
@@ -62,12 +99,12 @@ class EntriesAPIView(BaseView):
             tree_service.set_position(
                 resource_id=resource.resource_id, to_position=total_children, db_session=self.request.dbsession,
             )
-        return schema.dump(resource)
+        return dump(self.request, EntryCreateSchema, resource)
 
     @view_config(request_method="PATCH", permission="owner")
     def patch(self):
         resource = self.shared.entry_get(self.request.matchdict["object_id"])
-        schema = EntryCreateSchema(context={"request": self.request, "modified_obj": resource})
+        schema = make_schema(self.request, EntryCreateSchema, modified_obj=resource)
         data = schema.load(self.request.unsafe_json_body, partial=True)
         # we need to ensure we are not overwriting the values
         # before move_to_position is invoked
@@ -84,7 +121,7 @@ class EntriesAPIView(BaseView):
                 to_position=position,
                 db_session=self.request.dbsession,
             )
-        return schema.dump(resource)
+        return dump(self.request, EntryCreateSchema, resource)
 
     @view_config(request_method="DELETE", permission="owner")
     def delete(self):
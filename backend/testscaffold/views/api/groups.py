@@ -6,6 +6,7 @@ import logging
 from pyramid.view import view_config, view_defaults
 
 from testscaffold.models.db import Group
+from testscaffold.validation.dumpers import dump, make_schema
 from testscaffold.validation.schemes import GroupEditSchema
 from testscaffold.views import BaseView
 from testscaffold.views.shared.groups import GroupsShared
@@ -26,31 +27,30 @@ class GroupsAPIView(BaseView):
     @view_config(route_name="api_objects", request_method="GET")
     def collection_list(self):
         groups = self.shared.collection_list()
-        schema = GroupEditSchema(context={"request": self.request})
-        return schema.dump([group for group in groups], many=True)
+        return dump(self.request, GroupEditSchema, groups, many=True)
 
     @view_config(route_name="api_objects", request_method="POST")
     def post(self):
-        schema = GroupEditSchema(context={"request": self.request})
+        schema = make_schema(self.request, GroupEditSchema)
         data = schema.load(self.request.unsafe_json_body)
         group = Group()
         self.shared.populate_instance(group, data)
         group.persist(flush=True, db_session=self.request.dbsession)
-        return schema.dump(group)
+        return dump(self.request, GroupEditSchema, group)
 
     @view_config(request_method="GET")
     def get(self):
-        schema = GroupEditSchema(context={"request": self.request})
+        self.shared.check_not_modified(self.request.matchdict["object_id"])
         group = self.shared.group_get(self.request.matchdict["object_id"])
-        return schema.dump(group)
+        return dump(self.request, GroupEditSchema, group)
 
     @view_config(request_method="PATCH")
     def patch(self):
         group = self.shared.group_get(self.request.matchdict["object_id"])
-        schema = GroupEditSchema(context={"request": self.request, "modified_obj": group})
+        schema = make_schema(self.request, GroupEditSchema, modified_obj=group)
         data = schema.load(self.request.unsafe_json_body)
         self.shared.populate_instance(group, data)
-        return schema.dump(group)
+        return dump(self.request, GroupEditSchema, group)
 
     @view_config(request_method="DELETE")
     def delete(self):
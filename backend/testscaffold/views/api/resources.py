@@ -4,7 +4,6 @@ from __future__ import absolute_import
 
 from pyramid.view import view_config, view_defaults
 
-from testscaffold.services.user import UserService
 from testscaffold.validation.schemes import (
     UserResourcePermissionSchema,
     GroupResourcePermissionSchema,
@@ -29,7 +28,7 @@ class ResourcesUserPermissionsAPI:
 
         schema = UserResourcePermissionSchema(context={"request": self.request, "resource": resource})
         data = schema.load(self.request.unsafe_json_body)
-        user = UserService.by_user_name(data["user_name"], db_session=self.request.dbsession)
+        user = schema.context["users"][data["user_name"].lower()]
         perm_inst = self.shared.user_permission_post(resource, user.id, data["perm_name"])
         self.request.dbsession.flush()
         return perm_inst.get_dict()
@@ -44,7 +43,7 @@ class ResourcesUserPermissionsAPI:
             "perm_name": self.request.GET.get("perm_name"),
         }
         data = schema.load(params)
-        user = UserService.by_user_name(data["user_name"], db_session=self.request.dbsession)
+        user = schema.context["users"][data["user_name"].lower()]
         self.shared.user_permission_delete(resource, user.id, data["perm_name"])
         return True
 
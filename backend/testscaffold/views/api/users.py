@@ -3,11 +3,13 @@ from __future__ import absolute_import
 
 import logging
 
+from pyramid.settings import asbool
 from pyramid.view import view_config, view_defaults
 
 from testscaffold.models.db import User
 from testscaffold.util import safe_integer
 from testscaffold.util.request import gen_pagination_headers
+from testscaffold.validation.dumpers import dump, make_schema
 from testscaffold.validation.schemes import UserCreateSchema
 from testscaffold.validation.schemes import UserEditSchema
 from testscaffold.validation.schemes import UserSearchSchema
@@ -27,36 +29,48 @@ class UserAPIView(BaseView):
 
     @view_config(route_name="api_objects", request_method="GET")
     def collection_list(self):
-        schema = UserCreateSchema(context={"request": self.request})
         page = safe_integer(self.request.GET.get("page", 1))
         filter_params = UserSearchSchema().load(self.request.GET.mixed())
-        user_paginator = self.shared.collection_list(page=page, filter_params=filter_params)
+        # passing `cursor` switches to keyset pagination
+        user_paginator = self.shared.collection_list(
+            page=page,
+            filter_params=filter_params,
+            cursor=self.request.GET.get("cursor"),
+            with_count=asbool(self.request.GET.get("count")),
+        )
         headers = gen_pagination_headers(request=self.request, paginator=user_paginator)
         self.request.response.headers.update(headers)
-        return schema.dump(user_paginator.items, many=True)
+        return dump(self.request, UserCreateSchema, user_paginator.items, many=True)
+
+    @view_config(route_name="api_objects_export", request_method="GET")
+    def export(self):
+        """ streams all matching users, `format` is ndjson (default) or csv """
+        filter_params = UserSearchSchema().load(self.request.GET.mixed())
+        export_format = self.request.GET.get("format", "ndjson")
+        return self.shared.export(filter_params=filter_params, export_format=export_format)
 
     @view_config(route_name="api_objects", request_method="POST")
     def post(self):
-        schema = UserCreateSchema(context={"request": self.request})
+        schema = make_schema(self.request, UserCreateSchema)
         data = schema.load(self.request.unsafe_json_body)
         user = User()
         self.shared.populate_instance(user, data)
         user.persist(flush=True, db_session=self.request.dbsession)
-        return schema.dump(user)
+        return dump(self.request, UserCreateSchema, user)
 
     @view_config(request_method="GET")
     def get(self):
-        schema = UserCreateSchema(context={"request": self.request})
+        self.shared.check_not_modified(self.request.matchdict["object_id"])
         user = self.shared.user_get(self.request.matchdict["object_id"])
-        return schema.dump(user)
+        return dump(self.request, UserCreateSchema, user)
 
     @view_config(request_method="PATCH")
     def patch(self):
         user = self.shared.user_get(self.request.matchdict["object_id"])
-        schema = UserEditSchema(context={"request": self.request, "modified_obj": user})
+        schema = make_schema(self.request, UserEditSchema, modified_obj=user)
         data = schema.load(self.request.unsafe_json_body, partial=True)
         self.shared.populate_instance(user, data)
-        return schema.dump(user)
+        return dump(self.request, UserEditSchema, user)
 
     @view_config(request_method="DELETE")
     def delete(self):
@@ -17,9 +17,8 @@ class EntriesViews(BaseView):
     def get(self):
         request = self.request
         resource = request.context.resource
-        result = tree_service.from_parent_deeper(resource.resource_id, limit_depth=2, db_session=request.dbsession)
-        breadcrumbs = tree_service.path_upper(resource.resource_id, db_session=request.dbsession)
-        tree = tree_service.build_subtree_strut(result)
+        tree = tree_service.cached_subtree(resource.resource_id, limit_depth=2, db_session=request.dbsession)
+        breadcrumbs = tree_service.cached_path_upper(resource.resource_id, db_session=request.dbsession)
         return {
             "resource": resource,
             "breadcrumbs": breadcrumbs,
@@ -31,12 +31,10 @@ class IndexViews(BaseView):
     )
     def index(self):
         request = self.request
-        login_form = UserLoginForm(request.POST, context={"request": request})
         log.warning("index", extra={"foo": "xxx"})
         log.info("locale", extra={"locale": request.locale_name})
-        result = tree_service.from_parent_deeper(None, limit_depth=2, db_session=request.dbsession)
-        tree = tree_service.build_subtree_strut(result)
-        return {"login_form": login_form, "menu_entries": tree["children"]}
+        tree = tree_service.cached_subtree(None, limit_depth=2, db_session=request.dbsession)
+        return {"menu_entries": tree["children"]}
 
     @view_config(
         route_name="objects",
@@ -66,7 +64,11 @@ class IndexViews(BaseView):
                 user.regenerate_security_code()
                 user.security_code_date = datetime.utcnow()
                 title = self.translate(_("${project} :: New password request", mapping={"project": "testscaffold"},))
-                email_vars = {"user": user, "request": request, "email_title": title}
+                # celery task renders the mail so vars have to be serializable
+                email_vars = {
+                    "user": {"user_name": user.user_name, "security_code": user.security_code},
+                    "email_title": title,
+                }
 
                 ev = EmailEvent(
                     request,
@@ -189,7 +191,7 @@ class IndexViews(BaseView):
                 request.registry.notify(SocialAuthEvent(request, new_user, social_data))
 
             title = _("${project} :: Start information", mapping={"project": "testscaffold"})
-            email_vars = {"user": new_user, "email_title": self.translate(title)}
+            email_vars = {"user": {"user_name": new_user.user_name}, "email_title": self.translate(title)}
             ev = EmailEvent(
                 request,
                 recipients=[new_user.email],
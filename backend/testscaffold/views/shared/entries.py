@@ -3,13 +3,23 @@ from __future__ import absolute_import
 
 import logging
 
+import marshmallow
+import paginate
 import pyramid.httpexceptions
 from pyramid.i18n import TranslationStringFactory
 
+from testscaffold.services.count import CountService
 from testscaffold.services.entry import EntryService
+from testscaffold.services.entry_bulk import EntryBulkService
+from testscaffold.services.resource_tree_service import tree_service
 from testscaffold.util import safe_integer
+from testscaffold.util.conditional import check_not_modified, make_etag
+from testscaffold.util.export import export_response
+from testscaffold.validation.schemes import EntryBulkOperationSchema, EntryCreateSchema
 
 ENTRIES_PER_PAGE = 50
+PARENT_CHOICES_PER_PAGE = 25
+BULK_MAX_OPERATIONS = 5000
 
 log = logging.getLogger(__name__)
 
@@ -26,18 +36,87 @@ class EntriesShared:
         self.translate = request.localizer.translate
         self.page = 1
 
-    def collection_list(self, page=1, filter_params=None):
+    def collection_list(self, page=1, filter_params=None, cursor=None, with_count=False):
         request = self.request
+        self.page = page
         entry_paginator = EntryService.get_paginator(
             page=self.page,
             items_per_page=ENTRIES_PER_PAGE,
             # url_maker gets passed to SqlalchemyOrmPage
             url_maker=lambda p: request.current_route_url(_query={"page": p}),
             filter_params=filter_params,
+            cursor=cursor,
+            with_count=with_count,
+            count_mode=CountService.mode_for(request.registry.settings, "entries"),
             db_session=request.dbsession,
         )
         return entry_paginator
 
+    def check_collection_not_modified(self, filter_params=None):
+        """
+        Answers conditional GET of entry lists from latest `updated_date` and
+        row count, Last-Modified is not sent because it can't reflect removals.
+        Aggregate runs only for clients revalidating with If-None-Match, plain
+        listings skip it, a conditional request that misses gets current ETag
+        """
+        request = self.request
+        if "If-None-Match" not in request.headers:
+            return
+        updated_date, item_count = EntryService.collection_version(filter_params, db_session=request.dbsession)
+        etag = make_etag("entries", request.query_string, updated_date, item_count)
+        check_not_modified(request, etag)
+
+    def export(self, filter_params=None, export_format="ndjson"):
+        request = self.request
+        query = EntryService.export_query(filter_params, db_session=request.dbsession)
+        return export_response(request, query, EntryCreateSchema, "entries", export_format=export_format)
+
+    def search(self, terms, page=1):
+        request = self.request
+        snapshot = request.effective_permissions
+        if not snapshot:
+            raise pyramid.httpexceptions.HTTPForbidden()
+        if not terms or not terms.strip():
+            raise pyramid.httpexceptions.HTTPBadRequest()
+        return EntryService.search(
+            terms,
+            snapshot,
+            page=page,
+            items_per_page=ENTRIES_PER_PAGE,
+            count_mode=CountService.mode_for(request.registry.settings, "entries_search"),
+            db_session=request.dbsession,
+        )
+
+    def parent_choices(self, q=None, page=1):
+        """ pages over cached tree index, `q` matches resource names case insensitively """
+        nodes = tree_service.cached_index(db_session=self.request.dbsession).values()
+        if q:
+            q = q.lower()
+            nodes = [node for node in nodes if q in node.resource_name.lower()]
+        paginator = paginate.Page(list(nodes), page=page, items_per_page=PARENT_CHOICES_PER_PAGE)
+        paginator.count_mode = "exact"
+        return paginator
+
+    def bulk(self, operations):
+        """
+        Applies list of create/patch/move operations, all of them succeed or
+        ValidationError keyed by operation index is raised
+        """
+        request = self.request
+        if not isinstance(operations, list):
+            raise marshmallow.ValidationError({"operations": [self.translate(_("List of operations expected"))]})
+        if len(operations) > BULK_MAX_OPERATIONS:
+            msg = self.translate(_("At most ${max} operations are allowed", mapping={"max": BULK_MAX_OPERATIONS}))
+            raise marshmallow.ValidationError({"operations": [msg]})
+        schema = EntryBulkOperationSchema(context={"request": request}, many=True)
+        data = schema.load(operations)
+        results, errors = EntryBulkService.apply(
+            data, request.user, request.effective_permissions, db_session=request.dbsession
+        )
+        if errors:
+            raise marshmallow.ValidationError(errors)
+        return results
+
     def populate_instance(self, instance, data, *args, **kwargs):
         # this is safe and doesn't overwrite entry_password with cleartext
         instance.populate_obj(data, *args, **kwargs)
@@ -9,7 +9,11 @@ from testscaffold.models.db import Group
 from testscaffold.models.db import GroupPermission
 from testscaffold.services.group import GroupService
 from testscaffold.services.group_permission import GroupPermissionService
+from testscaffold.services.permission_snapshot import PermissionSnapshotService
 from testscaffold.services.user import UserService
+from testscaffold.util import safe_integer
+from testscaffold.util.conditional import check_not_modified, make_etag
+from testscaffold.util.request import flash
 
 log = logging.getLogger(__name__)
 
@@ -29,6 +33,14 @@ class GroupsShared:
         groups = GroupService.all(Group, db_session=self.request.dbsession)
         return groups
 
+    def check_not_modified(self, obj_id):
+        """ answers conditional GET from `updated_date` before group is loaded """
+        group_id = safe_integer(obj_id)
+        updated_date = GroupService.version(group_id, db_session=self.request.dbsession)
+        if updated_date is None:
+            raise pyramid.httpexceptions.HTTPNotFound()
+        check_not_modified(self.request, make_etag("group", group_id, updated_date.isoformat()), updated_date)
+
     def group_get(self, obj_id):
         request = self.request
         group = GroupService.get(obj_id, db_session=request.dbsession)
@@ -64,8 +76,9 @@ class GroupsShared:
         log.info(
             "group_delete", extra={"group_id": instance.id, "group_name": instance.group_name},
         )
+        PermissionSnapshotService.invalidate_group(instance.id, db_session=self.request.dbsession)
         instance.delete(self.request.dbsession)
-        self.request.session.flash({"msg": self.translate(_("Group removed.")), "level": "success"})
+        flash(self.request, {"msg": self.translate(_("Group removed.")), "level": "success"})
 
     def permission_post(self, group, perm_name):
         try:
@@ -77,9 +90,8 @@ class GroupsShared:
             )
             permission_inst = GroupPermission(perm_name=perm_name)
             group.permissions.append(permission_inst)
-            self.request.session.flash(
-                {"msg": self.translate(_("Permission granted for group.")), "level": "success",}
-            )
+            PermissionSnapshotService.invalidate_group(group.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("Permission granted for group.")), "level": "success"})
         return permission_inst
 
     def permission_delete(self, group, permission):
@@ -92,14 +104,14 @@ class GroupsShared:
                 extra={"group_id": group.id, "group_name": group.group_name, "perm_name": permission.perm_name,},
             )
             group.permissions.remove(permission_inst)
-            self.request.session.flash(
-                {"msg": self.translate(_("Permission withdrawn from group.")), "level": "success",}
-            )
+            PermissionSnapshotService.invalidate_group(group.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("Permission withdrawn from group.")), "level": "success"})
 
     def user_post(self, group, user):
         if user not in group.users:
             group.users.append(user)
-            self.request.session.flash({"msg": self.translate(_("User added to group.")), "level": "success"})
+            PermissionSnapshotService.invalidate(user.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("User added to group.")), "level": "success"})
             log.info(
                 "group_user_post",
                 extra={
@@ -113,9 +125,8 @@ class GroupsShared:
     def user_delete(self, group, user):
         if user in group.users:
             group.users.remove(user)
-            self.request.session.flash(
-                {"msg": self.translate(_("User removed from group.")), "level": "success",}
-            )
+            PermissionSnapshotService.invalidate(user.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("User removed from group.")), "level": "success"})
             log.info(
                 "group_user_delete",
                 extra={
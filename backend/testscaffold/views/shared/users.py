@@ -6,11 +6,18 @@ from datetime import datetime
 
 import pyramid.httpexceptions
 from pyramid.i18n import TranslationStringFactory
+from testscaffold.services.auth_token import AuthTokenService
+from testscaffold.services.permission_snapshot import PermissionSnapshotService
 from testscaffold.services.user_permission import UserPermissionService
 from testscaffold.services.user import UserService
 from testscaffold.models.db import UserPermission
+from testscaffold.services.count import CountService
 from testscaffold.services.user import UserService
 from testscaffold.util import safe_integer
+from testscaffold.util.conditional import check_not_modified, make_etag
+from testscaffold.util.export import export_response
+from testscaffold.util.request import flash
+from testscaffold.validation.schemes import UserCreateSchema
 
 USERS_PER_PAGE = 50
 
@@ -29,7 +36,7 @@ class UsersShared:
         self.translate = request.localizer.translate
         self.page = 1
 
-    def collection_list(self, page=1, filter_params=None):
+    def collection_list(self, page=1, filter_params=None, cursor=None, with_count=False):
         request = self.request
         self.page = page
         user_paginator = UserService.get_paginator(
@@ -38,10 +45,26 @@ class UsersShared:
             # url_maker gets passed to SqlalchemyOrmPage
             url_maker=lambda p: request.current_route_url(_query={"page": p}),
             filter_params=filter_params,
+            cursor=cursor,
+            with_count=with_count,
+            count_mode=CountService.mode_for(request.registry.settings, "users"),
             db_session=request.dbsession,
         )
         return user_paginator
 
+    def export(self, filter_params=None, export_format="ndjson"):
+        request = self.request
+        query = UserService.export_query(filter_params, db_session=request.dbsession)
+        return export_response(request, query, UserCreateSchema, "users", export_format=export_format)
+
+    def check_not_modified(self, user_id):
+        """ answers conditional GET from `updated_date` before user is loaded """
+        user_id = safe_integer(user_id)
+        updated_date = UserService.version(user_id, db_session=self.request.dbsession)
+        if updated_date is None:
+            raise pyramid.httpexceptions.HTTPNotFound()
+        check_not_modified(self.request, make_etag("user", user_id, updated_date.isoformat()), updated_date)
+
     def user_get(self, user_id):
         request = self.request
         user = UserService.get(safe_integer(user_id), db_session=request.dbsession)
@@ -53,7 +76,7 @@ class UsersShared:
     def populate_instance(self, instance, data, *args, **kwargs):
         # this is safe and doesn't overwrite user_password with cleartext
         instance.populate_obj(data, *args, **kwargs)
-        self.request.session.flash({"msg": self.translate(_("User updated.")), "level": "success"})
+        flash(self.request, {"msg": self.translate(_("User updated.")), "level": "success"})
         log.info(
             "user_populate_instance",
             extra={"action": "updated", "x": datetime.now(), "y": datetime.utcnow().date(), "user_id": instance.id,},
@@ -61,15 +84,18 @@ class UsersShared:
         if data.get("password"):
             # set hashed password
             UserService.set_password(instance, data["password"])
-            self.request.session.flash({"msg": self.translate(_("User password updated.")), "level": "success"})
+            flash(self.request, {"msg": self.translate(_("User password updated.")), "level": "success"})
         log.info("user_GET_PATCH", extra={"action": "password_updated"})
 
     def delete(self, instance):
         log.info(
             "user_delete", extra={"user_id": instance.id, "user_name": instance.user_name},
         )
+        # tokens are removed by db cascade so orm events won't see them
+        AuthTokenService.invalidate_for_user(instance, db_session=self.request.dbsession)
+        PermissionSnapshotService.invalidate(instance.id, db_session=self.request.dbsession)
         instance.delete(self.request.dbsession)
-        self.request.session.flash({"msg": self.translate(_("User removed.")), "level": "success"})
+        flash(self.request, {"msg": self.translate(_("User removed.")), "level": "success"})
 
     def permission_get(self, user, permission):
         permission = UserPermissionService.by_user_and_perm(user.id, permission, db_session=self.request.dbsession)
@@ -87,9 +113,8 @@ class UsersShared:
             )
             permission_inst = UserPermission(perm_name=perm_name)
             user.user_permissions.append(permission_inst)
-            self.request.session.flash(
-                {"msg": self.translate(_("Permission granted for user.")), "level": "success",}
-            )
+            PermissionSnapshotService.invalidate(user.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("Permission granted for user.")), "level": "success"})
         return permission_inst
 
     def permission_delete(self, user, permission):
@@ -102,6 +127,5 @@ class UsersShared:
                 extra={"user_id": user.id, "user_name": user.user_name, "permission": permission.perm_name,},
             )
             user.user_permissions.remove(permission_inst)
-            self.request.session.flash(
-                {"msg": self.translate(_("Permission withdrawn from user.")), "level": "success",}
-            )
+            PermissionSnapshotService.invalidate(user.id, db_session=self.request.dbsession)
+            flash(self.request, {"msg": self.translate(_("Permission withdrawn from user.")), "level": "success"})
@@ -3,8 +3,12 @@ from __future__ import absolute_import
 
 import logging
 
+import pyramid.httpexceptions
 from pyramid.view import view_config, view_defaults
 
+from testscaffold.services.auth_token import AuthTokenService
+from testscaffold.util import safe_integer
+
 log = logging.getLogger(__name__)
 
 
@@ -32,3 +36,17 @@ class GroupsUserRelationAPI:
     def auth_tokens(self):
         auth_tokens = []
         return {"auth_tokens": auth_tokens}
+
+    @view_config(
+        match_param=("object=user_self", "relation=auth_tokens", "verb=DELETE"), request_method="POST",
+    )
+    def auth_token_delete(self):
+        """ removes one of own tokens, it stops authenticating as soon as transaction commits """
+        request = self.request
+        token_id = safe_integer(request.POST.get("token_id"))
+        auth_token = AuthTokenService.by_id_and_owner(token_id, request.user.id, db_session=request.dbsession)
+        if not auth_token:
+            raise pyramid.httpexceptions.HTTPNotFound()
+        request.dbsession.delete(auth_token)
+        request.dbsession.flush()
+        return {"id": token_id}